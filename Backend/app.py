@@ -1,69 +1,67 @@
-from flask import Flask, jsonify, request
+from flask import Flask, Blueprint, current_app, jsonify, request
 from flask_cors import CORS
-import numpy as np
-from scipy import signal
-from scipy.io import wavfile
-import io
-import json
+from flask_compress import Compress
+import importlib
+import logging
 import os
-import tempfile
 import sys
 
-# Add current directory to path
-sys.path.append(os.path.dirname(__file__))
+# Add current directory to path, ahead of site-packages so `blueprints`/`utils` resolve here first
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-app = Flask(__name__)
-# Enhanced CORS configuration
-CORS(app, origins=["*"], methods=["GET", "POST", "PUT", "DELETE"], allow_headers=["*"])
+from utils.json_provider import OrjsonProvider
+from utils.signal_processing import SignalProcessor
 
-# Import and register blueprints one by one
-try:
-    # Generic Mode (try both function-based and class-based approaches)
-    try:
-        # First try class-based approach (from second app.py)
-        from blueprints.generic_mode import GenericMode
-        generic_mode = GenericMode()
-        app.register_blueprint(generic_mode.blueprint, url_prefix='/api/generic')
-        print("✅ Generic mode blueprint (class-based) registered successfully!")
-    except ImportError:
-        # Fall back to function-based approach (from first app.py)
-        from blueprints.generic_mode import generic_bp
-        app.register_blueprint(generic_bp, url_prefix='/api/generic')
-        print("✅ Generic mode blueprint (function-based) registered successfully!")
-    
-except ImportError as e:
-    print(f"❌ Generic mode import error: {e}")
+# Worker threads for the waitress server started by `python app.py`
+SERVER_THREADS = int(os.environ.get('DSP_SERVER_THREADS', 8))
 
-try:
-    # AI Mode (class-based blueprint)
-    from blueprints.ai_mode import AIMode
-    ai_mode = AIMode()
-    app.register_blueprint(ai_mode.blueprint, url_prefix='/api/ai')
-    print("✅ AI mode blueprint registered successfully!")
-    
-except ImportError as e:
-    print(f"❌ AI mode import error: {e}")
+# Preload (and on CUDA compile) the separation models in the background at startup
+WARMUP_AI_MODELS = os.environ.get('DSP_WARMUP_MODELS', '1') != '0'
 
-try:
-    # Customized Modes
-    from blueprints.customized_mode import CustomizedMode
-    
-    instruments_mode = CustomizedMode('instruments')
-    app.register_blueprint(instruments_mode.blueprint, url_prefix='/api/instruments')
-    print("✅ Instruments mode blueprint registered successfully!")
+# Top-level routes (API info, health, error handlers) shared by every app instance
+core_bp = Blueprint('core', __name__)
+
+# (mode, module, attribute, constructor args, blueprint type) for every mode blueprint.
+# Classes are instantiated with the args; plain Blueprint objects are registered as is.
+MODE_REGISTRY = [
+    ('generic', 'blueprints.generic_mode', 'generic_bp', None, 'function-based'),
+    ('ai', 'blueprints.ai_mode', 'AIMode', (), 'class'),
+    ('instruments', 'blueprints.customized_mode', 'CustomizedMode', ('instruments',), 'customized'),
+    ('animals', 'blueprints.customized_mode', 'CustomizedMode', ('animals',), 'customized'),
+    ('voices', 'blueprints.customized_mode', 'CustomizedMode', ('voices',), 'customized'),
+]
+
+def register_mode_blueprints(app):
+    """Import and register the mode blueprints listed in MODE_REGISTRY"""
+    # Blueprint type per mode, filled in as each blueprint registers successfully.
+    # Availability checks read this instead of re-importing the blueprint modules
+    # (a failed import such as a missing torch is retried on every call otherwise).
+    registered_modes = app.extensions['registered_modes']
     
-    animals_mode = CustomizedMode('animals')
-    app.register_blueprint(animals_mode.blueprint, url_prefix='/api/animals')
-    print("✅ Animals mode blueprint registered successfully!")
+    # Every mode hangs off one /api parent that is registered on the app once
+    api_bp = Blueprint('api', __name__)
     
-    voices_mode = CustomizedMode('voices')
-    app.register_blueprint(voices_mode.blueprint, url_prefix='/api/voices')
-    print("✅ Voices mode blueprint registered successfully!")
+    for mode, module_name, attribute, args, blueprint_type in MODE_REGISTRY:
+        try:
+            module = importlib.import_module(module_name)
+        except ImportError as e:
+            print(f"❌ {mode} mode import error: {e}")
+            continue
+        
+        target = getattr(module, attribute)
+        mode_instance = target(*args) if args is not None else None
+        blueprint = mode_instance.blueprint if mode_instance is not None else target
+        
+        api_bp.register_blueprint(blueprint, url_prefix=f'/{mode}')
+        registered_modes[mode] = blueprint_type
+        print(f"✅ {mode} mode blueprint ({blueprint_type}) registered successfully!")
+        
+        if mode == 'ai' and WARMUP_AI_MODELS:
+            mode_instance.ai_handler.start_warmup()
     
-except ImportError as e:
-    print(f"❌ Customized modes import error: {e}")
+    app.register_blueprint(api_bp, url_prefix='/api')
 
-@app.route('/')
+@core_bp.route('/')
 def home():
     """Main API endpoint with all available modes"""
     endpoints = {
@@ -91,35 +89,23 @@ def home():
         "endpoints": available_endpoints
     })
 
-@app.route('/api/health', methods=['GET'])
+@core_bp.route('/api/health', methods=['GET'])
 def health_check():
     """Comprehensive health check for all modes"""
     modes_status = {}
     
-    # Check generic mode
-    try:
-        # Try both import approaches for generic mode
-        try:
-            from blueprints.generic_mode import GenericMode
-            modes_status['generic'] = {"status": "healthy", "type": "class-based"}
-        except ImportError:
-            from blueprints.generic_mode import generic_bp
-            modes_status['generic'] = {"status": "healthy", "type": "function-based"}
-    except ImportError:
-        modes_status['generic'] = {"status": "unavailable", "type": "blueprint"}
-    
-    # Check AI mode
-    try:
-        from blueprints.ai_mode import AIMode
-        modes_status['ai'] = {"status": "healthy", "type": "class"}
-    except ImportError:
-        modes_status['ai'] = {"status": "unavailable", "type": "class"}
+    # Check generic and AI modes
+    for mode in ['generic', 'ai']:
+        if mode in current_app.extensions['registered_modes']:
+            modes_status[mode] = {"status": "healthy", "type": current_app.extensions['registered_modes'][mode]}
+        else:
+            modes_status[mode] = {"status": "unavailable", "type": "blueprint" if mode == 'generic' else "class"}
     
     # Check customized modes
+    from utils.audio_utils import AudioUtils
     customized_modes = ['instruments', 'animals', 'voices']
     for mode in customized_modes:
         try:
-            from utils.audio_utils import AudioUtils
             settings = AudioUtils.load_mode_settings(mode)
             modes_status[mode] = {
                 "status": "healthy",
@@ -140,7 +126,7 @@ def health_check():
         "modes": modes_status
     })
 
-@app.route('/api/test', methods=['GET'])
+@core_bp.route('/api/test', methods=['GET'])
 def test_endpoint():
     """Test endpoint to verify backend is working"""
     return jsonify({
@@ -151,7 +137,7 @@ def test_endpoint():
         "timestamp": "2024-01-01T00:00:00Z"  # From second app.py
     })
 
-@app.route('/api/info', methods=['GET'])
+@core_bp.route('/api/info', methods=['GET'])
 def api_info():
     """Detailed API information"""
     return jsonify({
@@ -187,7 +173,7 @@ def api_info():
         }
     })
 
-@app.route('/api/hello', methods=['GET'])
+@core_bp.route('/api/hello', methods=['GET'])
 def hello():
     """Simple hello endpoint from second app.py"""
     return jsonify({
@@ -205,24 +191,7 @@ def hello():
 
 def is_blueprint_available(mode_name):
     """Check if a specific blueprint is available"""
-    try:
-        if mode_name == 'generic_mode':
-            # Try both approaches for generic mode
-            try:
-                from blueprints.generic_mode import GenericMode
-                return True
-            except ImportError:
-                from blueprints.generic_mode import generic_bp
-                return True
-        elif mode_name == 'ai_mode':
-            from blueprints.ai_mode import AIMode
-            return True
-        elif mode_name in ['instruments_mode', 'animals_mode', 'voices_mode']:
-            from blueprints.customized_mode import CustomizedMode
-            return True
-    except ImportError:
-        return False
-    return False
+    return mode_name.replace('_mode', '') in current_app.extensions['registered_modes']
 
 def list_available_modes():
     """List all available modes"""
@@ -240,7 +209,7 @@ def list_available_modes():
     return available
 
 # Error handlers
-@app.errorhandler(404)
+@core_bp.app_errorhandler(404)
 def not_found(error):
     return jsonify({
         "status": "error",
@@ -257,7 +226,7 @@ def not_found(error):
         }
     }), 404
 
-@app.errorhandler(500)
+@core_bp.app_errorhandler(500)
 def internal_error(error):
     return jsonify({
         "status": "error",
@@ -265,7 +234,48 @@ def internal_error(error):
         "suggestion": "Check if all required blueprints are properly installed"
     }), 500
 
+def create_app(config=None):
+    """Create the Flask app with CORS, the core routes and every mode blueprint that imports"""
+    app = Flask(__name__)
+    app.json = OrjsonProvider(app)
+    
+    # Compress JSON only: WAV/ZIP audio is near incompressible and would just burn CPU.
+    # The hook is registered below instead, so base64-audio JSON can opt out too.
+    app.config.update(
+        COMPRESS_ALGORITHM=['br', 'gzip'],
+        COMPRESS_MIMETYPES=['application/json', 'text/html'],
+        COMPRESS_MIN_SIZE=256,
+        COMPRESS_REGISTER=False,
+    )
+    if config:
+        app.config.update(config)
+    compress = Compress(app)
+    
+    @app.after_request
+    def compress_response(response):
+        """Flask-Compress, except for responses marked by utils.json_provider.uncompressed"""
+        if getattr(response, 'skip_compression', False):
+            return response
+        return compress.after_request(response)
+    
+    # Enhanced CORS configuration
+    CORS(app, origins=["*"], methods=["GET", "POST", "PUT", "DELETE"], allow_headers=["*"])
+    
+    if SignalProcessor.use_fftw_backend():
+        print("⚡ scipy.fft running on pyFFTW with cached plans")
+    
+    app.extensions['registered_modes'] = {}
+    register_mode_blueprints(app)
+    app.register_blueprint(core_bp)
+    
+    return app
+
+app = create_app()
+
 if __name__ == '__main__':
+    # Per-request processing steps log at DEBUG; set DSP_LOG_LEVEL=DEBUG to see them
+    logging.basicConfig(level=os.environ.get('DSP_LOG_LEVEL', 'INFO'))
+    
     # Create necessary directories
     os.makedirs('settings', exist_ok=True)
     os.makedirs('temp', exist_ok=True)
@@ -285,8 +295,17 @@ if __name__ == '__main__':
     print("   - POST /api/[mode]/process - Process audio in specific mode")
     print("   - GET  /api/[mode]/settings - Get mode settings")
     print()
-    print("🔧 Modes available:", list_available_modes())
+    with app.app_context():
+        print("🔧 Modes available:", list_available_modes())
     print()
     print("✅ All features from both app.py files have been merged!")
     
-    app.run(debug=True, port=5000, host='0.0.0.0')
\ No newline at end of file
+    if os.environ.get('DSP_DEBUG') == '1':
+        # Werkzeug dev server with the debugger and auto-reloader
+        app.run(debug=True, port=5000, host='0.0.0.0')
+    else:
+        # Multi-threaded WSGI server: numpy/scipy/torch release the GIL while
+        # they compute, so uploads and encoding overlap with other requests
+        from waitress import serve
+        print(f"🧵 Serving with waitress ({SERVER_THREADS} threads), set DSP_DEBUG=1 for the dev server")
+        serve(app, host='0.0.0.0', port=5000, threads=SERVER_THREADS)
\ No newline at end of file
@@ -1,12 +1,18 @@
-from flask import request, jsonify
+from flask import Response, request, jsonify
 from .base_mode import BaseMode
 from utils.ai_models import AIModelManager
-from utils.signal_processing import SignalProcessor
+from utils.audio_utils import AudioUtils
+from utils.visualization import VisualizationUtils
+from utils.request_batcher import RequestBatcher
+from utils.stem_cache import StemCache, DecodedStemCache
+from utils.signal_processing import FFT_WORKERS
+from utils.json_provider import uncompressed
 import os
-import base64
-import io
+import time
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
-import soundfile as sf
+import orjson
+import scipy.fft
 import torch
 import logging
 
@@ -19,7 +25,21 @@ class AIMode(BaseMode):
     def __init__(self):
         super().__init__('ai', 'ai')
         self.ai_handler = AIModelManager()
-        self.signal_processor = SignalProcessor()
+        logger.info("AIModelManager id=%s", id(self.ai_handler))
+        
+        # Concurrent separation requests share one worker so they reach the model in batches
+        self.music_batcher = RequestBatcher(self._separate_music_batch)
+        
+        # Separated stems stay server-side so mix_stems only has to receive gains
+        self.stem_cache = StemCache()
+        
+        # Clients without a live session re-send the same stems on every gain change
+        self.decoded_stems = DecodedStemCache()
+        
+        # Quantizes stem chunks in parallel while a response streams the base64 out
+        self.encode_pool = ThreadPoolExecutor(
+            max_workers=min(6, os.cpu_count() or 1), thread_name_prefix='stem-encode'
+        )
         
         # Add custom AI endpoints
         self.blueprint.add_url_rule('/music_separation', 'music_separation', 
@@ -44,53 +64,95 @@ class AIMode(BaseMode):
             "recommended_mode": "music_separation" if len(signal) > sample_rate * 5 else "voice_separation"
         }
     
-    def tensor_to_base64(self, audio_tensor, sample_rate=44100):
-        """Convert torch tensor to base64 audio data URI"""
+    def read_upload(self, audio_file):
+        """Decode the upload to (frames, sample_rate) for the AI handler, or hand over the file if libsndfile can't read it"""
         try:
-            # Convert to numpy
-            if isinstance(audio_tensor, torch.Tensor):
-                audio_np = audio_tensor.cpu().numpy()
-            else:
-                audio_np = np.array(audio_tensor)
-            
-            logger.info(f"Converting tensor: shape={audio_np.shape}, sr={sample_rate}")
-            
-            # Ensure correct shape for soundfile (samples, channels)
-            if audio_np.ndim == 1:
-                audio_np = audio_np[:, np.newaxis]  # mono: (samples, 1)
-            elif audio_np.ndim == 2:
-                if audio_np.shape[0] < audio_np.shape[1]:
-                    # If shape is (channels, samples), transpose
-                    audio_np = audio_np.T
-            
-            logger.info(f"After reshape: {audio_np.shape}")
-            
-            # Create in-memory buffer
-            buffer = io.BytesIO()
-            
-            # Write WAV to buffer
-            sf.write(buffer, audio_np, sample_rate, format='WAV', subtype='PCM_16')
-            buffer.seek(0)
-            
-            # Encode to base64
-            audio_bytes = buffer.read()
-            base64_audio = base64.b64encode(audio_bytes).decode('utf-8')
-            
-            logger.info(f"✅ Converted to base64: {len(base64_audio)} chars")
-            
-            # Return as data URI
-            return f"data:audio/wav;base64,{base64_audio}"
-            
+            return AudioUtils.read_upload_frames(audio_file)
         except Exception as e:
-            logger.error(f"Error converting tensor to base64: {e}", exc_info=True)
+            logger.warning("⚠️  Could not decode %s in memory (%s), passing the file", audio_file.filename, e)
+            audio_file.seek(0)
+            return audio_file
+    
+    def _separate_music_batch(self, requests):
+        """Run one batch of queued (audio_file, model_name) music separation requests,
+        yielding (index, result) so each request is released as soon as its stems are ready"""
+        # Padded forward passes per model used in the batch, over inputs of similar length
+        by_model = {}
+        for index, (audio_file, model_name) in enumerate(requests):
+            by_model.setdefault(model_name, []).append((index, audio_file))
+        
+        for model_name, items in by_model.items():
+            outputs = self.ai_handler.iter_separate_with_htdemucs_batch(
+                [audio_file for _, audio_file in items], model_name
+            )
+            for item, output in outputs:
+                yield items[item][0], output
+    
+    def tensor_to_frames(self, audio_tensor):
+        """Convert a separation output to a (samples, channels) numpy array"""
+        if isinstance(audio_tensor, torch.Tensor):
+            audio_np = audio_tensor.cpu().numpy()
+        else:
+            audio_np = np.asarray(audio_tensor)
+        
+        if audio_np.ndim == 1:
+            audio_np = audio_np[:, np.newaxis]  # mono: (samples, 1)
+        elif audio_np.ndim == 2 and audio_np.shape[0] < audio_np.shape[1]:
+            # If shape is (channels, samples), transpose
+            audio_np = audio_np.T
+        return audio_np
+    
+    def collect_tracks(self, tensors):
+        """(samples, channels) arrays for the non-empty separation outputs, in order"""
+        tracks = {}
+        for name, tensor in tensors.items():
+            if tensor is None:
+                logger.warning("⚠️  %s is None", name)
+                continue
+            tracks[name] = self.tensor_to_frames(tensor)
+        return tracks
+    
+    def stream_stems_json(self, meta, field, tracks, sample_rate):
+        """Stream meta plus {field: {name: WAV data URI}} as JSON, base64-encoding each stem chunk by chunk"""
+        def generate():
+            started = time.perf_counter()
+            # The metadata object minus its closing brace, then the stems object written incrementally
+            yield orjson.dumps(meta)[:-1] + b',' + orjson.dumps(field) + b':{'
+            for i, (name, frames) in enumerate(tracks.items()):
+                yield (b',' if i else b'') + orjson.dumps(name) + b':"data:audio/wav;base64,'
+                yield from AudioUtils.iter_wav_base64(frames, sample_rate, executor=self.encode_pool)
+                yield b'"'
+            yield b'}}'
+            logger.info("Encoded %s %s in %.3fs", len(tracks), field, time.perf_counter() - started)
+        
+        # Base64 WAV throughout, so compression would cost far more than it saves
+        return uncompressed(Response(generate(), mimetype='application/json'))
+    
+    def stems_zip_response(self, tracks, sample_rate, download_name):
+        """Stream the separation outputs as raw WAV files in one ZIP archive"""
+        return AudioUtils.stream_wav_zip(tracks, sample_rate, download_name)
+    
+    def cache_stems(self, tracks, sample_rate):
+        """Stack the outputs into one (n_stems, channels, samples) float32 array and cache it
+
+        Returns the session id, or None when the stems are too large to cache (the client then
+        mixes from the stems it received).
+        """
+        length = min(len(frames) for frames in tracks.values())
+        channels = max(frames.shape[1] for frames in tracks.values())
+        if not self.stem_cache.fits(len(tracks) * channels * length * 4):
+            logger.info("Stems too large to cache (%s samples), no session", length)
             return None
+        stems = np.empty((len(tracks), channels, length), dtype=np.float32)
+        for i, frames in enumerate(tracks.values()):
+            stems[i] = frames[:length].T  # mono stems broadcast across channels
+        
+        return self.stem_cache.put(tracks.keys(), stems, sample_rate, self.stem_spectra(stems))
     
     def separate_music(self):
         """Separate music into stems using Demucs"""
         try:
-            logger.info("="*80)
             logger.info("🎵 MUSIC SEPARATION REQUEST")
-            logger.info("="*80)
             
             # Get audio file from request
             audio_file = request.files.get('audio')
@@ -98,22 +160,21 @@ class AIMode(BaseMode):
                 logger.error("No audio file in request")
                 return jsonify({"success": False, "error": "No audio file provided"}), 400
 
-            logger.info(f"Processing file: {audio_file.filename}")
+            logger.info("Processing file: %s", audio_file.filename)
             
             # Get model name
             model_name = request.form.get('model_name', 'htdemucs_6s')
-            logger.info(f"Using model: {model_name}")
+            logger.info("Using model: %s", model_name)
             
-            # Reset file pointer
-            audio_file.seek(0)
+            audio = self.read_upload(audio_file)
             
             # Call the AI handler (returns tensors)
             logger.info("Starting Demucs separation...")
-            result = self.ai_handler.separate_with_htdemucs(audio_file, model_name)
+            result = self.music_batcher.submit((audio, model_name))
             
             # Unpack results (7 values: 6 tensors + message)
             if len(result) != 7:
-                logger.error(f"Unexpected return format: got {len(result)} values")
+                logger.error("Unexpected return format: got %s values", len(result))
                 return jsonify({
                     "success": False,
                     "error": f"Model returned unexpected format"
@@ -123,20 +184,11 @@ class AIMode(BaseMode):
             
             # Check for errors
             if message and message.startswith("❌"):
-                logger.error(f"Separation failed: {message}")
+                logger.error("Separation failed: %s", message)
                 return jsonify({"success": False, "error": message}), 500
             
-            logger.info(f"Separation complete: {message}")
+            logger.info("Separation complete: %s", message)
             
-            # Build response
-            response_data = {
-                'success': True,
-                'message': message,
-                'sample_rate': 44100,
-                'stems': {}
-            }
-            
-            # Convert tensors to base64
             stems_data = {
                 'drums': drums,
                 'bass': bass,
@@ -146,44 +198,37 @@ class AIMode(BaseMode):
                 'piano': piano
             }
             
-            logger.info("Converting stem tensors to base64...")
-            converted_count = 0
-            
-            for stem_name, tensor in stems_data.items():
-                if tensor is not None:
-                    logger.info(f"Converting {stem_name}: shape={tensor.shape}")
-                    base64_data = self.tensor_to_base64(tensor, sample_rate=44100)
-                    
-                    if base64_data:
-                        response_data['stems'][stem_name] = base64_data
-                        converted_count += 1
-                        logger.info(f"✅ {stem_name} converted")
-                    else:
-                        logger.error(f"❌ Failed to convert {stem_name}")
-                else:
-                    logger.warning(f"⚠️  {stem_name} is None")
-            
-            logger.info(f"Successfully converted {converted_count}/{len(stems_data)} stems")
-            logger.info("="*80 + "\n")
-            
-            if converted_count == 0:
+            tracks = self.collect_tracks(stems_data)
+            if not tracks:
                 return jsonify({
                     "success": False,
                     "error": "No stems were successfully generated"
                 }), 500
             
-            return jsonify(response_data), 200
+            # format=zip: raw WAV stems in a streamed archive instead of base64 JSON
+            if request.values.get('format') == 'zip':
+                return self.stems_zip_response(tracks, 44100, 'stems.zip')
+            
+            # Build response; the stems are base64-encoded while the response streams
+            response_meta = {
+                'success': True,
+                'message': message,
+                'sample_rate': 44100,
+                'session_id': self.cache_stems(tracks, 44100)
+            }
+            
+            logger.info("Streaming %s/%s stems as base64 WAV", len(tracks), len(stems_data))
+            
+            return self.stream_stems_json(response_meta, 'stems', tracks, 44100)
             
         except Exception as e:
-            logger.error(f"MUSIC SEPARATION ERROR: {str(e)}", exc_info=True)
+            logger.error("MUSIC SEPARATION ERROR: %s", e, exc_info=True)
             return jsonify({"success": False, "error": str(e)}), 500
     
     def separate_voices(self):
         """Separate voices using Asteroid"""
         try:
-            logger.info("="*80)
             logger.info("🎤 VOICE SEPARATION REQUEST")
-            logger.info("="*80)
             
             # Get audio file from request
             audio_file = request.files.get('audio')
@@ -191,18 +236,17 @@ class AIMode(BaseMode):
                 logger.error("No audio file in request")
                 return jsonify({"success": False, "error": "No audio file provided"}), 400
 
-            logger.info(f"Processing file: {audio_file.filename}")
+            logger.info("Processing file: %s", audio_file.filename)
             
-            # Reset file pointer
-            audio_file.seek(0)
+            audio = self.read_upload(audio_file)
             
             # Call the AI handler (returns tensors)
             logger.info("Starting Asteroid separation...")
-            result = self.ai_handler.separate_voices_with_asteroid(audio_file)
+            result = self.ai_handler.separate_voices_with_asteroid(audio)
             
             # Unpack results (5 values: 4 tensors + message)
             if len(result) != 5:
-                logger.error(f"Unexpected return format: got {len(result)} values")
+                logger.error("Unexpected return format: got %s values", len(result))
                 return jsonify({
                     "success": False,
                     "error": f"Model returned unexpected format"
@@ -212,20 +256,11 @@ class AIMode(BaseMode):
             
             # Check for errors
             if message and message.startswith("❌"):
-                logger.error(f"Separation failed: {message}")
+                logger.error("Separation failed: %s", message)
                 return jsonify({"success": False, "error": message}), 500
             
-            logger.info(f"Separation complete: {message}")
-            
-            # Build response
-            response_data = {
-                'success': True,
-                'message': message,
-                'sample_rate': 8000,
-                'voices': {}
-            }
+            logger.info("Separation complete: %s", message)
             
-            # Convert tensors to base64
             voices_data = {
                 'voice_1': voice1,
                 'voice_2': voice2,
@@ -233,188 +268,234 @@ class AIMode(BaseMode):
                 'voice_4': voice4
             }
             
-            logger.info("Converting voice tensors to base64...")
-            converted_count = 0
-            
-            for voice_name, tensor in voices_data.items():
-                if tensor is not None:
-                    logger.info(f"Converting {voice_name}: shape={tensor.shape}")
-                    base64_data = self.tensor_to_base64(tensor, sample_rate=8000)
-                    
-                    if base64_data:
-                        response_data['voices'][voice_name] = base64_data
-                        converted_count += 1
-                        logger.info(f"✅ {voice_name} converted")
-                    else:
-                        logger.error(f"❌ Failed to convert {voice_name}")
-                else:
-                    logger.warning(f"⚠️  {voice_name} is None")
-            
-            logger.info(f"Successfully converted {converted_count}/{len(voices_data)} voices")
-            logger.info("="*80 + "\n")
-            
-            if converted_count == 0:
+            tracks = self.collect_tracks(voices_data)
+            if not tracks:
                 return jsonify({
                     "success": False,
                     "error": "No voices were successfully generated"
                 }), 500
             
-            return jsonify(response_data), 200
+            # format=zip: raw WAV stems in a streamed archive instead of base64 JSON
+            if request.values.get('format') == 'zip':
+                return self.stems_zip_response(tracks, 8000, 'voices.zip')
+            
+            # Build response; the voices are base64-encoded while the response streams
+            response_meta = {
+                'success': True,
+                'message': message,
+                'sample_rate': 8000,
+                'session_id': self.cache_stems(tracks, 8000)
+            }
+            
+            logger.info("Streaming %s/%s voices as base64 WAV", len(tracks), len(voices_data))
+            
+            return self.stream_stems_json(response_meta, 'voices', tracks, 8000)
             
         except Exception as e:
-            logger.error(f"VOICE SEPARATION ERROR: {str(e)}", exc_info=True)
+            logger.error("VOICE SEPARATION ERROR: %s", e, exc_info=True)
             return jsonify({"success": False, "error": str(e)}), 500
     
+    def positive_spectrum(self, signal, sample_rate, max_samples=100000, num_bins=1000):
+        """Spectrum of the first max_samples samples, averaged into num_bins log-spaced bins (20 Hz to Nyquist)
+
+        (samples, channels) input is downmixed to mono, but only over the samples analysed.
+        """
+        n = min(len(signal), max_samples)
+        head = signal[:n]
+        if head.ndim > 1:
+            head = AudioUtils.to_mono_float32(head)
+        
+        # rfft computes only the bins that are kept, in C, with no power-of-2 padding
+        magnitudes = np.abs(scipy.fft.rfft(head, workers=FFT_WORKERS))
+        freqs = np.fft.rfftfreq(n, 1/sample_rate)
+        return VisualizationUtils.log_bin_spectrum(freqs, magnitudes, sample_rate, num_bins)
+    
+    def stem_spectra(self, stems, max_samples=100000):
+        """rfft of each stem's mono downmix over the samples positive_spectrum() analyses, as complex64"""
+        n = min(stems.shape[-1], max_samples)
+        # One batched transform over the float32 downmixes: complex64 out directly, and the
+        # independent per-stem rows are spread over FFT_WORKERS threads
+        return scipy.fft.rfft(stems[:, :, :n].mean(axis=1, dtype=np.float32), axis=1, workers=FFT_WORKERS)
+    
+    def mixed_spectrum(self, spectra, weights, length, sample_rate, max_samples=100000, num_bins=1000):
+        """positive_spectrum() of a gain-weighted mix, computed from the per-stem spectra
+
+        The FFT is linear, so the mix spectrum is the weighted sum of the stem spectra
+        and no time-domain mix or FFT is needed.
+        """
+        n = min(length, max_samples)
+        magnitudes = np.abs(weights @ spectra)
+        freqs = np.fft.rfftfreq(n, 1/sample_rate)
+        return VisualizationUtils.log_bin_spectrum(freqs, magnitudes, sample_rate, num_bins)
+    
     def mix_stems(self):
-        """Mix multiple stems/voices with individual gain controls"""
+        """Mix multiple stems/voices with individual gain controls
+
+        Deprecated for browsers with Web Audio: the frontend mixes the stems
+        itself and only calls analyze_mixed_audio. Kept as the fallback.
+        """
         try:
-            logger.info("="*80)
             logger.info("🎚️ MIX STEMS REQUEST")
-            logger.info("="*80)
             
             data = request.get_json()
             
-            if not data or 'stems' not in data or 'gains' not in data:
+            if not data or 'gains' not in data or ('stems' not in data and 'session_id' not in data):
                 return jsonify({"success": False, "error": "Missing stems or gains data"}), 400
             
-            stems_base64 = data['stems']
             gains = data['gains']
             sample_rate = data.get('sample_rate', 44100)
+            logger.info("Gains: %s", gains)
             
-            logger.info(f"Mixing {len(stems_base64)} stems at {sample_rate}Hz")
-            logger.info(f"Gains: {gains}")
+            cached = self.stem_cache.get(data['session_id']) if data.get('session_id') else None
             
-            # Decode and mix all stems
-            mixed_audio = None
+            if cached is not None:
+                # Stems are still on the server: one weighted sum over the stacked array
+                names, stems, sample_rate, spectra = cached
+                logger.info("Mixing %s cached stems at %sHz", len(names), sample_rate)
+                
+                weights = np.array([gains.get(name, 0.0) for name in names], dtype=np.float32)
+                mixed_audio = np.tensordot(weights, stems, axes=(0, 0)).T
+                
+                # Convert to stereo if mono
+                if mixed_audio.shape[1] == 1:
+                    mixed_audio = np.repeat(mixed_audio, 2, axis=1)
+            
+            elif 'stems' not in data:
+                return jsonify({
+                    "success": False,
+                    "session_expired": True,
+                    "error": "Stem session expired, send the stems again"
+                }), 410
             
-            for stem_name, base64_data in stems_base64.items():
-                if stem_name not in gains:
-                    continue
+            else:
+                stems_base64 = data['stems']
+                logger.info("Mixing %s stems at %sHz", len(stems_base64), sample_rate)
                 
-                gain = gains[stem_name]
+                # Decode all stems (float32)
+                decoded = []
                 
-                try:
-                    # Decode base64 to audio
-                    if ',' in base64_data:
-                        base64_data = base64_data.split(',')[1]
-                    
-                    audio_data = base64.b64decode(base64_data)
-                    buffer = io.BytesIO(audio_data)
-                    
-                    # Load audio
-                    audio, sr = sf.read(buffer)
+                for stem_name, base64_data in stems_base64.items():
+                    if stem_name not in gains:
+                        continue
                     
-                    # Convert to stereo if mono
-                    if audio.ndim == 1:
-                        audio = np.stack([audio, audio], axis=-1)
+                    try:
+                        # Decode base64 to audio (cached across gain changes)
+                        audio, sr = self.decoded_stems.get_or_decode(base64_data, AudioUtils.decode_wav_base64)
+                        
+                        decoded.append((audio, np.float32(gains[stem_name])))
                     
-                    # Apply gain
-                    audio = audio * gain
-                    
-                    # Mix
-                    if mixed_audio is None:
-                        mixed_audio = audio
-                    else:
-                        min_len = min(len(mixed_audio), len(audio))
-                        mixed_audio = mixed_audio[:min_len] + audio[:min_len]
+                    except Exception as e:
+                        logger.error("Error processing %s: %s", stem_name, e)
+                        continue
                 
-                except Exception as e:
-                    logger.error(f"Error processing {stem_name}: {e}")
-                    continue
+                # Mix into one preallocated float32 buffer, reusing a single scratch buffer for the gain
+                mixed_audio = None
+                if decoded:
+                    min_len = min(len(audio) for audio, _ in decoded)
+                    mixed_audio = np.zeros((min_len, 2), dtype=np.float32)
+                    scaled = np.empty_like(mixed_audio)
+                    scaled_mono = scaled[:, :1]
+                    for audio, gain in decoded:
+                        if audio.ndim == 1:
+                            # Mono stems broadcast across both channels instead of being stacked to stereo
+                            np.multiply(audio[:min_len, np.newaxis], gain, out=scaled_mono)
+                            mixed_audio += scaled_mono
+                        else:
+                            np.multiply(audio[:min_len], gain, out=scaled)
+                            mixed_audio += scaled
             
             if mixed_audio is None:
                 return jsonify({"success": False, "error": "No audio to mix"}), 400
             
-            # Normalize
-            max_val = np.abs(mixed_audio).max()
-            if max_val > 0.99:
-                mixed_audio = mixed_audio * (0.99 / max_val)
-            
-            # Convert to mono for frequency analysis
-            mixed_mono = mixed_audio.mean(axis=1) if mixed_audio.ndim > 1 else mixed_audio
+            # Normalize in place (the peak is a min/max reduction, no abs() copy)
+            max_val = AudioUtils.peak_amplitude(mixed_audio)
+            scale = 0.99 / max_val if max_val > 0.99 else 1.0
+            if scale != 1.0:
+                mixed_audio *= np.float32(scale)
             
-            # Compute frequency spectrum using custom FFT
+            # Compute frequency spectrum (downmixed to mono over the analysed samples only)
             logger.info("Computing frequency spectrum...")
-            fft_result = self.signal_processor.custom_fft(mixed_mono[:min(len(mixed_mono), 100000)])  # Limit for performance
-            freqs = np.fft.fftfreq(len(fft_result), 1/sample_rate)
-            magnitudes = np.abs(fft_result)
-            
-            # Only positive frequencies
-            positive_freqs = freqs[:len(freqs)//2]
-            positive_mags = magnitudes[:len(magnitudes)//2]
+            if cached is not None and spectra is not None:
+                positive_freqs, positive_mags = self.mixed_spectrum(spectra, weights * scale, stems.shape[-1], sample_rate)
+            else:
+                positive_freqs, positive_mags = self.positive_spectrum(mixed_audio, sample_rate)
             
             # Convert back to base64
-            buffer = io.BytesIO()
-            sf.write(buffer, mixed_audio, sample_rate, format='WAV', subtype='PCM_16')
-            buffer.seek(0)
-            
-            mixed_base64 = base64.b64encode(buffer.read()).decode('utf-8')
+            mixed_base64 = AudioUtils.encode_wav_base64(mixed_audio, sample_rate)
             mixed_data_uri = f"data:audio/wav;base64,{mixed_base64}"
             
             logger.info("✅ Mixing complete")
-            logger.info("="*80 + "\n")
             
-            return jsonify({
+            # The payload is mostly the base64 WAV, so it skips compression
+            return uncompressed(jsonify({
                 'success': True,
                 'mixed_audio': mixed_data_uri,
                 'sample_rate': sample_rate,
                 'frequency_data': {
-                    'frequencies': positive_freqs.tolist()[:1000],  # Limit data size
-                    'magnitudes': positive_mags.tolist()[:1000]
+                    'frequencies': positive_freqs,
+                    'magnitudes': positive_mags
                 }
-            }), 200
+            })), 200
             
         except Exception as e:
-            logger.error(f"MIX STEMS ERROR: {str(e)}", exc_info=True)
+            logger.error("MIX STEMS ERROR: %s", e, exc_info=True)
             return jsonify({"success": False, "error": str(e)}), 500
     
     def analyze_mixed_audio(self):
-        """Analyze mixed audio and return frequency plot data"""
+        """Analyze mixed audio and return frequency plot data
+
+        Only the first positive_spectrum() max_samples are used, so clients that
+        mix locally send just the mono downmix of that span. Clients holding a
+        live session can send session_id, gains and the normalization scale
+        instead, and the spectrum is taken from the cached stem spectra.
+        """
         try:
             data = request.get_json()
             
+            cached = self.stem_cache.get(data['session_id']) if data and data.get('session_id') else None
+            
+            if cached is not None and cached[3] is not None and 'gains' in data:
+                names, stems, sample_rate, spectra = cached
+                gains = data['gains']
+                weights = np.array([gains.get(name, 0.0) for name in names], dtype=np.float32)
+                weights *= np.float32(data.get('scale', 1.0))
+                
+                positive_freqs, positive_mags = self.mixed_spectrum(spectra, weights, stems.shape[-1], sample_rate)
+                
+                return jsonify({
+                    'success': True,
+                    'frequency_data': {
+                        'frequencies': positive_freqs,
+                        'magnitudes': positive_mags
+                    }
+                }), 200
+            
             if not data or 'audio' not in data:
+                if data and data.get('session_id'):
+                    return jsonify({
+                        "success": False,
+                        "session_expired": True,
+                        "error": "Stem session expired, send the audio instead"
+                    }), 410
                 return jsonify({"success": False, "error": "Missing audio data"}), 400
             
             base64_data = data['audio']
             sample_rate = data.get('sample_rate', 44100)
             
             # Decode base64 to audio
-            if ',' in base64_data:
-                base64_data = base64_data.split(',')[1]
-            
-            audio_data = base64.b64decode(base64_data)
-            buffer = io.BytesIO(audio_data)
+            audio, sr = AudioUtils.decode_wav_base64(base64_data)
             
-            # Load audio
-            audio, sr = sf.read(buffer)
-            
-            # Convert to mono
-            if audio.ndim > 1:
-                audio = audio.mean(axis=1)
-            
-            # Compute FFT
-            fft_result = self.signal_processor.custom_fft(audio[:min(len(audio), 100000)])
-            freqs = np.fft.fftfreq(len(fft_result), 1/sample_rate)
-            magnitudes = np.abs(fft_result)
-            
-            # Only positive frequencies
-            positive_freqs = freqs[:len(freqs)//2]
-            positive_mags = magnitudes[:len(magnitudes)//2]
+            # Compute FFT (stereo input is downmixed over the analysed samples only)
+            positive_freqs, positive_mags = self.positive_spectrum(audio, sample_rate)
             
             return jsonify({
                 'success': True,
                 'frequency_data': {
-                    'frequencies': positive_freqs.tolist()[:1000],
-                    'magnitudes': positive_mags.tolist()[:1000]
+                    'frequencies': positive_freqs,
+                    'magnitudes': positive_mags
                 }
             }), 200
             
         except Exception as e:
-            logger.error(f"ANALYZE ERROR: {str(e)}", exc_info=True)
+            logger.error("ANALYZE ERROR: %s", e, exc_info=True)
             return jsonify({"success": False, "error": str(e)}), 500
-
-
-# Create AI mode blueprint instance
-ai_mode_instance = AIMode()
-ai_bp = ai_mode_instance.blueprint
\ No newline at end of file
@@ -1,11 +1,12 @@
-from flask import Blueprint, request, jsonify, send_file
-import json
+from flask import Blueprint, Response, request, jsonify, send_file
+import orjson
 import sys
 import os
 import numpy as np
-import base64
 import io
+import logging
 import time
+from concurrent.futures import ThreadPoolExecutor
 
 # Add the utils directory to Python path
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
@@ -13,6 +14,10 @@ sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 from utils.signal_processing import SignalProcessor
 from utils.audio_utils import AudioUtils
 from utils.visualization import VisualizationUtils
+from utils.input_cache import InputCache
+from utils.audio_store import AudioStore
+
+logger = logging.getLogger(__name__)
 
 class BaseMode:
     """Base class for ALL modes to eliminate code repetition"""
@@ -21,6 +26,14 @@ class BaseMode:
         self.mode_name = mode_name
         self.mode_type = mode_type
         self.blueprint = Blueprint(f'{mode_name}_{mode_type}_bp', __name__)
+        # Decoded signal + input spectrogram per uploaded file, reused across slider changes
+        self.input_cache = InputCache()
+        # Processed WAVs, fetched by token from /download_processed instead of inlined as base64
+        self.processed_audio = AudioStore()
+        # Runs the output STFT next to the input-side work of the same request
+        self.spectrogram_pool = ThreadPoolExecutor(
+            max_workers=min(4, os.cpu_count() or 1), thread_name_prefix=f'{mode_name}-stft'
+        )
         self.setup_routes()
     
     def setup_routes(self):
@@ -40,7 +53,7 @@ class BaseMode:
         def process_audio():
             """Process audio with current settings - COMMON for all modes"""
             try:
-                print(f"🎯 Processing request received for mode: {self.mode_name}")
+                logger.debug("🎯 Processing request received for mode: %s", self.mode_name)
                 
                 if 'file' not in request.files:
                     return jsonify({'error': 'No file uploaded'}), 400
@@ -51,21 +64,34 @@ class BaseMode:
                 
                 processing_data = self.parse_processing_request(request)
                 
-                # Load audio and process
-                print("📥 Loading audio file...")
-                signal, sample_rate = AudioUtils.load_audio_file(file)
-                print(f"✅ Audio loaded: {len(signal)} samples, {sample_rate}Hz")
+                # Load audio and process (the same file is re-sent on every slider change)
+                logger.debug("📥 Loading audio file...")
+                data = file.read()
+                signal, sample_rate, *input_spectrogram = self.input_cache.get_or_compute(
+                    data, lambda: self.load_input(data)
+                )
+                processing_data['input_spectrogram'] = input_spectrogram
+                logger.debug("✅ Audio loaded: %s samples, %sHz", len(signal), sample_rate)
                 
-                print("🔧 Processing signal...")
+                logger.debug("🔧 Processing signal...")
                 result = self.process_signal(signal, sample_rate, processing_data)
-                print("✅ Signal processing completed")
+                logger.debug("✅ Signal processing completed")
                 
-                return jsonify(result)
+                # Plot arrays go out as base64 float32 buffers rather than JSON number lists
+                return jsonify(VisualizationUtils.pack_arrays(result))
                 
             except Exception as e:
-                print(f"❌ Error in process_audio: {str(e)}")
+                logger.error("❌ Error in process_audio: %s", e)
                 return jsonify({'success': False, 'error': str(e)}), 500
         
+        @bp.route('/download_processed/<token>', methods=['GET'])
+        def download_processed(token):
+            """Raw WAV of a /process result"""
+            wav = self.processed_audio.get(token)
+            if wav is None:
+                return jsonify({'error': 'Processed audio expired, process the file again'}), 404
+            return Response(wav, mimetype='audio/wav')
+        
         @bp.route('/test_signal', methods=['POST'])
         def generate_test_signal():
             """Generate test signal - COMMON for all modes"""
@@ -73,18 +99,27 @@ class BaseMode:
                 data = request.json
                 frequencies = data.get('frequencies', [100, 500, 1000, 2000])
                 
-                signal, sample_rate = AudioUtils.generate_test_signal(frequencies)
-                buffer = AudioUtils.save_audio_to_buffer(signal, sample_rate)
+                # Same parameters always give the same signal, so serve it from the on-disk cache
+                path = AudioUtils.get_test_signal_path(frequencies)
                 
                 return send_file(
-                    buffer,
+                    path,
                     mimetype='audio/wav',
                     as_attachment=True,
-                    download_name=f'test_signal_{self.mode_name}.wav'
+                    download_name=f'test_signal_{self.mode_name}.wav',
+                    conditional=True
                 )
             except Exception as e:
                 return jsonify({'error': str(e)}), 500
     
+    def load_input(self, data):
+        """Decode uploaded WAV bytes and compute the input spectrogram with its scale-independent views"""
+        signal, sample_rate = AudioUtils.load_audio_file(io.BytesIO(data))
+        spectrogram, time_axis, freq_axis = SignalProcessor.compute_spectrogram(signal, sample_rate=sample_rate)
+        # Time-averaged magnitudes and the dB heatmap don't depend on the sliders or the scale
+        magnitudes, spectrogram_db = VisualizationUtils.spectrogram_views(spectrogram)
+        return signal, sample_rate, spectrogram, time_axis, freq_axis, magnitudes, spectrogram_db
+    
     def load_settings(self):
         """Load settings - Can be overridden by specific modes"""
         settings = AudioUtils.load_mode_settings(self.mode_name)
@@ -98,9 +133,9 @@ class BaseMode:
         scale_type = request.form.get('scale', 'linear')
         
         try:
-            slider_values = json.loads(slider_values)
-            print(f"🎚️ Slider values received: {slider_values}")
-        except json.JSONDecodeError:
+            slider_values = orjson.loads(slider_values)
+            logger.debug("🎚️ Slider values received: %s", slider_values)
+        except orjson.JSONDecodeError:
             raise Exception("Invalid slider values format")
         
         return {
@@ -115,8 +150,7 @@ class BaseMode:
         settings = processing_data['settings']
         scale_type = processing_data['scale_type']
         
-        print(f"⚙️ Processing parameters: {len(slider_values)} sliders, scale: {scale_type}")
-        print(f"🎯 BACKEND DEBUG: Scale type received: '{scale_type}'")  
+        logger.debug("⚙️ Processing parameters: %s sliders, scale: %s", len(slider_values), scale_type)
         
         # Validate input
         if not settings.get('sliders'):
@@ -125,53 +159,64 @@ class BaseMode:
         if len(slider_values) != len(settings['sliders']):
             raise Exception(f"Slider values count ({len(slider_values)}) doesn't match settings count ({len(settings['sliders'])})")
         
+        # Unity gains (the default preset on page load) leave the already normalized signal
+        # unchanged, so the FFT round trip and the output STFT are skipped
+        neutral = all(value == 1 for value in slider_values)
+        
         # Apply equalizer
-        print("🎛️ Applying multi-band equalizer...")
         start_time = time.time()
-        processed_signal = SignalProcessor.apply_multi_band_equalizer(
-            signal, settings['sliders'], slider_values, sample_rate
-        )
+        if neutral:
+            logger.debug("🎛️ All sliders at unity, reusing the input signal")
+            processed_signal = signal
+        else:
+            logger.debug("🎛️ Applying multi-band equalizer...")
+            processed_signal = SignalProcessor.apply_multi_band_equalizer(
+                signal, settings['sliders'], slider_values, sample_rate
+            )
         equalizer_time = time.time() - start_time
-        print(f"✅ Equalizer applied in {equalizer_time:.3f}s")
+        logger.debug("✅ Equalizer applied in %.3fs", equalizer_time)
         
         # Generate visualization data
-        print("📊 Computing spectrograms...")
+        logger.debug("📊 Computing spectrograms...")
         start_time = time.time()
-        input_spectrogram, input_time_axis, input_freq_axis = SignalProcessor.compute_spectrogram(signal, sample_rate=sample_rate)
-        output_spectrogram, output_time_axis, output_freq_axis = SignalProcessor.compute_spectrogram(processed_signal, sample_rate=sample_rate)
+        # The STFTs are independent and numpy/scipy.fft release the GIL, so the output one
+        # runs on the pool while this thread does the input one (or, when cached, the WAV encode)
+        output_future = None if neutral else self.spectrogram_pool.submit(
+            SignalProcessor.compute_spectrogram, processed_signal, sample_rate=sample_rate
+        )
+        if processing_data.get('input_spectrogram'):
+            input_spectrogram, input_time_axis, input_freq_axis, input_magnitudes, input_db = processing_data['input_spectrogram']
+        else:
+            input_spectrogram, input_time_axis, input_freq_axis = SignalProcessor.compute_spectrogram(signal, sample_rate=sample_rate)
+            input_magnitudes, input_db = VisualizationUtils.spectrogram_views(input_spectrogram)
+        
+        # Generate processed audio buffer for playback
+        logger.debug("🔊 Generating processed audio buffer...")
+        processed_audio_token = self.processed_audio.put(AudioUtils.encode_wav_bytes(processed_signal, sample_rate))
+        
+        if neutral:
+            output_spectrogram, output_time_axis, output_freq_axis = input_spectrogram, input_time_axis, input_freq_axis
+            output_magnitudes, output_db = input_magnitudes, input_db
+        else:
+            output_spectrogram, output_time_axis, output_freq_axis = output_future.result()
+            output_magnitudes, output_db = VisualizationUtils.spectrogram_views(output_spectrogram)
         spectrogram_time = time.time() - start_time
-        print(f"✅ Spectrograms computed in {spectrogram_time:.3f}s")
+        logger.debug("✅ Spectrograms computed in %.3fs", spectrogram_time)
         
         # Prepare data for frontend
-        print("📈 Preparing visualization data...")
-        input_spec_data = VisualizationUtils.prepare_spectrogram_data(input_spectrogram, input_freq_axis, scale_type)
-        output_spec_data = VisualizationUtils.prepare_spectrogram_data(output_spectrogram, output_freq_axis, scale_type)
+        logger.debug("📈 Preparing visualization data...")
+        input_spec_data = VisualizationUtils.prepare_spectrogram_data(input_spectrogram, input_freq_axis, scale_type, input_magnitudes)
+        output_spec_data = VisualizationUtils.prepare_spectrogram_data(output_spectrogram, output_freq_axis, scale_type, output_magnitudes)
         
         # Prepare 2D spectrogram data for heatmaps
-        input_spectrogram_2d = VisualizationUtils.prepare_spectrogram_2d(input_spectrogram, input_time_axis, input_freq_axis)
-        output_spectrogram_2d = VisualizationUtils.prepare_spectrogram_2d(output_spectrogram, output_time_axis, output_freq_axis)
-        
-        # Create time arrays for signal plots
-        input_time = np.linspace(0, len(signal)/sample_rate, len(signal))
-        output_time = np.linspace(0, len(processed_signal)/sample_rate, len(processed_signal))
-        
-        # Sample for performance
-        step = max(1, len(signal) // 1000)
-        input_signal_data = {
-            'time': input_time[::step].tolist(),
-            'amplitude': signal[::step].tolist()
-        }
-        output_signal_data = {
-            'time': output_time[::step].tolist(),
-            'amplitude': processed_signal[::step].tolist()
-        }
+        input_spectrogram_2d = VisualizationUtils.prepare_spectrogram_2d(input_spectrogram, input_time_axis, input_freq_axis, input_db)
+        output_spectrogram_2d = VisualizationUtils.prepare_spectrogram_2d(output_spectrogram, output_time_axis, output_freq_axis, output_db)
         
-        # Generate processed audio buffer for playback
-        print("🔊 Generating processed audio buffer...")
-        processed_buffer = AudioUtils.save_audio_to_buffer(processed_signal, sample_rate)
-        processed_audio_base64 = base64.b64encode(processed_buffer.getvalue()).decode('utf-8')
+        # Decimated signals for plotting
+        input_signal_data = VisualizationUtils.prepare_signal_data(signal, sample_rate)
+        output_signal_data = VisualizationUtils.prepare_signal_data(processed_signal, sample_rate)
         
-        print("✅ All processing completed successfully!")
+        logger.debug("✅ All processing completed successfully!")
         
         return {
             'success': True,
@@ -184,7 +229,7 @@ class BaseMode:
             'output_signal': output_signal_data,
             'sample_rate': sample_rate,
             'duration': len(signal) / sample_rate,
-            'processed_audio_base64': processed_audio_base64,
+            'processed_audio_token': processed_audio_token,
             'processing_times': {
                 'equalizer': equalizer_time,
                 'spectrogram': spectrogram_time
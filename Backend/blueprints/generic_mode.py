@@ -3,23 +3,45 @@ import numpy as np
 from scipy import signal as scipy_signal
 from scipy.io import wavfile
 import scipy.fft as fft
-import librosa
 import io
-import json
+import orjson
 import os
 import tempfile
 import soundfile as sf
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from functools import lru_cache
 
-# Import custom FFT and signal processing from base_mode
+# Import the FFT and signal processing utilities
 import sys
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
-from utils.signal_processing import SignalProcessor
+from utils.signal_processing import SignalProcessor, FFT_WORKERS, GPU_EQ, GPU_EQ_MIN_SAMPLES, gpu_available
 from utils.audio_utils import AudioUtils
 from utils.visualization import VisualizationUtils
+from utils.input_cache import InputCache
 
 generic_bp = Blueprint('generic', __name__)
 
+# Spectrum endpoints use scipy's rfft; DSP_CUSTOM_FFT=1 switches them back to the
+# pure-Python SignalProcessor.custom_fft for debugging
+USE_CUSTOM_FFT = os.environ.get('DSP_CUSTOM_FFT') == '1'
+# Transform the spectrum and equalizer endpoints run on, as reported by them and /health
+FFT_TYPE = 'custom' if USE_CUSTOM_FFT else 'rfft'
+
+# Inputs at least this long are equalized by overlap-save blocks instead of one whole-file FFT.
+# Off (0) by default: the block FIR only approximates the exact per-bin gains (a band at gain 0
+# still leaks a tone inside it at about -26 dB), so results would depend on file length. Opt in for memory-bound hosts.
+OVERLAP_SAVE_MIN_SAMPLES = int(os.environ.get('DSP_OVERLAP_SAVE_MIN_SAMPLES', 0))
+# Block FFT length and FIR length (odd, so the linear-phase delay is a whole number of samples)
+OVERLAP_SAVE_BLOCK = 1 << 15
+OVERLAP_SAVE_TAPS = 4097
+
+# Runs the overlap-save blocks; scipy.fft releases the GIL, so they overlap
+overlap_save_pool = ThreadPoolExecutor(max_workers=min(4, os.cpu_count() or 1), thread_name_prefix='eq-block')
+
+# Decoded, normalized uploads for process_audio: the page re-sends the same file on every band change
+input_cache = InputCache()
+
 print("✅ Generic mode blueprint loaded")
 
 # Create presets directory if it doesn't exist
@@ -38,6 +60,12 @@ def allowed_file(filename):
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+@lru_cache(maxsize=64)
+def read_preset_file(preset_file, mtime_ns):
+    """Parse a preset file; the mtime in the cache key invalidates saved-over files"""
+    with open(preset_file, 'rb') as f:
+        return orjson.loads(f.read())
+
 @generic_bp.route('/')
 def generic_home():
     """Root endpoint for generic mode"""
@@ -64,14 +92,14 @@ def list_presets():
         
         presets = []
         if os.path.exists(PRESETS_DIR):
-            for file in os.listdir(PRESETS_DIR):
+            # scandir entries carry the stat, so unchanged presets are served from the parse cache
+            for entry in os.scandir(PRESETS_DIR):
+                file = entry.name
                 if file.endswith('.json'):
                     preset_name = file[:-5]  # Remove .json extension
-                    preset_file = os.path.join(PRESETS_DIR, file)
                     
                     try:
-                        with open(preset_file, 'r', encoding='utf-8') as f:
-                            preset_data = json.load(f)
+                        preset_data = read_preset_file(entry.path, entry.stat().st_mtime_ns)
                         
                         presets.append({
                             'name': preset_name,
@@ -125,8 +153,9 @@ def save_preset():
         
         # Save to JSON file
         preset_file = os.path.join(PRESETS_DIR, f'{preset_name}.json')
-        with open(preset_file, 'w', encoding='utf-8') as f:
-            json.dump(preset_data, f, indent=2, ensure_ascii=False)
+        # orjson writes the indented UTF-8 file in one call instead of json.dump's many small writes
+        with open(preset_file, 'wb') as f:
+            f.write(orjson.dumps(preset_data, option=orjson.OPT_INDENT_2))
         
         print(f"💾 Saved preset: {preset_name} with {len(bands)} bands")
         
@@ -150,10 +179,15 @@ def load_preset():
         preset_file = os.path.join(PRESETS_DIR, f'{preset_name}.json')
         
         if os.path.exists(preset_file):
-            with open(preset_file, 'r', encoding='utf-8') as f:
-                preset_data = json.load(f)
-            print(f"✅ Loaded preset: {preset_name} with {len(preset_data.get('bands', []))} bands")
-            return jsonify(preset_data)
+            print(f"✅ Loaded preset: {preset_name}")
+            # The file already is the JSON response: send its bytes as-is, with an ETag so a
+            # client holding the current version gets an empty 304 instead
+            return send_file(
+                preset_file,
+                mimetype='application/json',
+                conditional=True,
+                etag=True
+            )
         else:
             print(f"⚠️  Preset not found, creating default: {preset_name}")
             # Return default preset if file doesn't exist
@@ -228,20 +262,23 @@ def generate_test_signal():
         
         # Generate time array
         t = np.linspace(0, duration, int(sample_rate * duration), endpoint=False)
-        signal_data = np.zeros_like(t)
+        freqs = np.asarray(frequencies, dtype=np.float64)
+        freq_amplitudes = (amplitude * (0.7 + 0.3 * (np.arange(len(freqs)) % 4))).astype(np.float32)
+        
+        # One (frequencies, samples) phase matrix; phases stay float64 since float32
+        # drifts by several hundredths of a radian at kHz frequencies after a few seconds
+        phases = np.outer(2 * np.pi * freqs, t)
         
         # Generate signal based on type
-        for i, freq in enumerate(frequencies):
-            freq_amplitude = amplitude * (0.7 + 0.3 * (i % 4))
-            
-            if signal_type == 'sine':
-                signal_data += freq_amplitude * np.sin(2 * np.pi * freq * t)
-            elif signal_type == 'square':
-                signal_data += freq_amplitude * scipy_signal.square(2 * np.pi * freq * t)
-            elif signal_type == 'sawtooth':
-                signal_data += freq_amplitude * scipy_signal.sawtooth(2 * np.pi * freq * t)
-            else:  # Default to sine
-                signal_data += freq_amplitude * np.sin(2 * np.pi * freq * t)
+        if signal_type == 'square':
+            waves = scipy_signal.square(phases).astype(np.float32)
+        elif signal_type == 'sawtooth':
+            waves = scipy_signal.sawtooth(phases).astype(np.float32)
+        else:  # sine, and the default
+            waves = np.sin(phases, out=np.empty(phases.shape, dtype=np.float32))
+        
+        # Weighted sum of all components as a single BLAS matrix-vector product
+        signal_data = freq_amplitudes @ waves
         
         # Add slight noise for realism
         noise = np.random.normal(0, 0.01, len(signal_data))
@@ -255,19 +292,13 @@ def generate_test_signal():
         signal_data *= envelope
         
         # Normalize
-        signal_data = signal_data / np.max(np.abs(signal_data))
-        
-        # Convert to WAV
-        buffer = io.BytesIO()
-        wavfile.write(buffer, sample_rate, (signal_data * 32767).astype(np.int16))
-        buffer.seek(0)
+        AudioUtils.peak_normalize(signal_data)
         
         print(f"✅ Test signal generated: {len(signal_data)} samples, {sample_rate}Hz")
         
-        return send_file(
-            buffer,
-            mimetype='audio/wav',
-            as_attachment=False,
+        return AudioUtils.stream_audio_response(
+            signal_data,
+            sample_rate,
             download_name='test_signal.wav'
         )
         
@@ -277,9 +308,9 @@ def generate_test_signal():
 
 @generic_bp.route('/process_audio', methods=['POST'])
 def process_audio():
-    """Process audio with generic equalizer settings using custom FFT"""
+    """Process audio with generic equalizer settings (real-input FFT, or the custom FFT when DSP_CUSTOM_FFT=1)"""
     try:
-        print("🎚️  Processing audio with equalizer (custom FFT)...")
+        print(f"🎚️  Processing audio with equalizer (FFT: {FFT_TYPE})...")
         
         if 'file' not in request.files:
             return jsonify({'error': 'No file uploaded'}), 400
@@ -299,51 +330,30 @@ def process_audio():
         
         # Parse settings
         try:
-            settings_data = json.loads(settings)
+            settings_data = orjson.loads(settings)
             bands = settings_data.get('bands', [])
             print(f"🎛️  Processing with {len(bands)} bands")
-        except json.JSONDecodeError as e:
+        except orjson.JSONDecodeError as e:
             return jsonify({'error': f'Invalid settings JSON: {str(e)}'}), 400
         
-        # Read audio file with format detection
-        audio_data, sample_rate, file_info = read_audio_file(file)
+        # Read audio file as float32 mono, once per distinct upload
+        data = file.read()
+        file.stream.seek(0)
+        audio_data, sample_rate, file_info = input_cache.get_or_compute(data, lambda: read_normalized_mono(file))
         
         print(f"🔊 Audio loaded: {file_info}")
         
-        # Convert to mono if stereo
-        if len(audio_data.shape) > 1:
-            audio_data = np.mean(audio_data, axis=1)
-            file_info['channels'] = 'mono (converted from stereo)'
-            print("🔄 Converted stereo to mono")
-        else:
-            file_info['channels'] = 'mono'
-        
-        # Normalize audio to float32
-        audio_data = audio_data.astype(np.float32)
-        if np.max(np.abs(audio_data)) > 0:
-            audio_data = audio_data / np.max(np.abs(audio_data))
-        
-        # Apply equalizer with custom FFT
+        # Apply equalizer
         processed_audio = apply_equalizer_custom_fft(audio_data, sample_rate, bands)
         
         # Normalize output
-        if np.max(np.abs(processed_audio)) > 0:
-            processed_audio = processed_audio / np.max(np.abs(processed_audio))
-        
-        # Convert to int16 for WAV
-        processed_audio_int16 = (processed_audio * 32767).astype(np.int16)
-        
-        # Save to buffer
-        buffer = io.BytesIO()
-        wavfile.write(buffer, sample_rate, processed_audio_int16)
-        buffer.seek(0)
+        processed_audio = AudioUtils.peak_normalize(processed_audio)
         
         print("✅ Audio processing completed successfully")
         
-        return send_file(
-            buffer,
-            mimetype='audio/wav',
-            as_attachment=False,
+        return AudioUtils.stream_audio_response(
+            processed_audio,
+            sample_rate,
             download_name=f'processed_{os.path.splitext(file.filename)[0]}.wav'
         )
         
@@ -353,9 +363,9 @@ def process_audio():
 
 @generic_bp.route('/compute_spectrum', methods=['POST'])
 def compute_spectrum():
-    """Compute frequency spectrum of audio signal using custom FFT"""
+    """Compute frequency spectrum of audio signal"""
     try:
-        print("📊 Computing frequency spectrum (custom FFT)...")
+        print("📊 Computing frequency spectrum...")
         
         if 'file' not in request.files:
             return jsonify({'error': 'No file uploaded'}), 400
@@ -370,56 +380,61 @@ def compute_spectrum():
         audio_data, sample_rate, file_info = read_audio_file(file)
         
         # Convert to mono if stereo
-        if len(audio_data.shape) > 1:
-            audio_data = np.mean(audio_data, axis=1)
+        audio_data = AudioUtils.to_mono_float32(audio_data)
         
         # Normalize
-        audio_data = audio_data.astype(np.float32)
-        if np.max(np.abs(audio_data)) > 0:
-            audio_data = audio_data / np.max(np.abs(audio_data))
+        audio_data = AudioUtils.peak_normalize(audio_data)
         
-        # Compute FFT with custom FFT and proper windowing
+        # Compute FFT with proper windowing
         n = len(audio_data)
         
         # Use Hann window to reduce spectral leakage
-        window = np.hanning(n)
-        windowed_audio = audio_data * window
-        
-        # Compute FFT using custom implementation
-        print("🌀 Computing FFT with custom implementation...")
-        fft_data = np.array(SignalProcessor.custom_fft(windowed_audio))
+        windowed_audio = audio_data * hann_window(n)
         
-        # Get frequencies - only positive frequencies
-        frequencies = np.fft.fftfreq(n, d=1/sample_rate)[:n//2]
-        magnitude = np.abs(fft_data[:n//2])
+        # Positive-frequency FFT
+        print("🌀 Computing FFT...")
+        fft_data, frequencies, fft_type = positive_spectrum(windowed_audio, sample_rate)
         
-        # Convert to dB scale for better visualization
-        magnitude_db = 20 * np.log10(magnitude + 1e-10)  # Add small value to avoid log(0)
+        magnitude = np.abs(fft_data)
         
-        # Compute phase
-        phase = np.angle(fft_data[:n//2])
-        
-        # Limit data size for frontend (to prevent huge responses)
+        # Limit data size for frontend (to prevent huge responses) by keeping the strongest
+        # bin of each block, so narrow peaks survive; dB and phase are then only computed
+        # for the bins that are sent
         max_points = 2000
         if len(frequencies) > max_points:
             step = len(frequencies) // max_points
-            frequencies = frequencies[::step]
-            magnitude = magnitude[::step]
-            magnitude_db = magnitude_db[::step]
-            phase = phase[::step]
+            full = len(magnitude) // step * step
+            peaks = magnitude[:full].reshape(-1, step).argmax(axis=1)
+            peaks += np.arange(0, full, step)
+            if full < len(magnitude):
+                peaks = np.append(peaks, full + magnitude[full:].argmax())
+            frequencies = frequencies[peaks]
+            fft_data = fft_data[peaks]
+            magnitude = magnitude[peaks]
+        
+        magnitude = magnitude.astype(np.float32)
+        
+        # Convert to dB scale for better visualization, in place on a single float32 buffer
+        magnitude_db = magnitude + np.float32(1e-10)  # Add small value to avoid log(0)
+        np.log10(magnitude_db, out=magnitude_db)
+        magnitude_db *= np.float32(20)
+        
+        # Compute phase
+        phase = np.angle(fft_data).astype(np.float32)
         
+        # Contiguous float32 arrays, which the orjson provider serializes straight from their buffers
         spectrum_data = {
-            'frequencies': frequencies.tolist(),
-            'magnitude': magnitude.tolist(),
-            'magnitude_db': magnitude_db.tolist(),
-            'phase': phase.tolist(),
+            'frequencies': np.ascontiguousarray(frequencies, dtype=np.float32),
+            'magnitude': magnitude,
+            'magnitude_db': magnitude_db,
+            'phase': phase,
             'sample_rate': sample_rate,
             'length': n,
             'max_frequency': frequencies[-1] if len(frequencies) > 0 else 0,
-            'fft_type': 'custom'
+            'fft_type': fft_type
         }
         
-        print(f"✅ Spectrum computed with custom FFT: {len(frequencies)} frequency points")
+        print(f"✅ Spectrum computed ({fft_type}): {len(frequencies)} frequency points")
         
         return jsonify(spectrum_data)
         
@@ -448,13 +463,10 @@ def compute_spectrogram():
         print(f"🔊 Audio loaded: {len(audio_data)} samples, {sample_rate}Hz")
         
         # Convert to mono if stereo
-        if len(audio_data.shape) > 1:
-            audio_data = np.mean(audio_data, axis=1)
+        audio_data = AudioUtils.to_mono_float32(audio_data)
         
         # Normalize
-        audio_data = audio_data.astype(np.float32)
-        if np.max(np.abs(audio_data)) > 0:
-            audio_data = audio_data / np.max(np.abs(audio_data))
+        audio_data = AudioUtils.peak_normalize(audio_data)
         
         # Directly use SignalProcessor for spectrogram computation
         print("📊 Computing spectrogram with SignalProcessor.compute_spectrogram...")
@@ -467,13 +479,14 @@ def compute_spectrogram():
         
         # Use VisualizationUtils to prepare the data
         print("📈 Preparing spectrogram data with VisualizationUtils...")
+        magnitudes, spectrogram_db = VisualizationUtils.spectrogram_views(spectrogram)
         spectrogram_2d = VisualizationUtils.prepare_spectrogram_2d(
-            spectrogram, time_axis, freq_axis
+            spectrogram, time_axis, freq_axis, spectrogram_db
         )
         
         # Also prepare the spectrum data for frequency plot
         spectrum_data = VisualizationUtils.prepare_spectrogram_data(
-            spectrogram, freq_axis, 'linear'
+            spectrogram, freq_axis, 'linear', magnitudes
         )
         
         result = {
@@ -509,14 +522,14 @@ def health():
         'endpoints_working': True,
         'presets_dir_exists': os.path.exists(PRESETS_DIR),
         'presets_count': len([f for f in os.listdir(PRESETS_DIR) if f.endswith('.json')]) if os.path.exists(PRESETS_DIR) else 0,
-        'fft_type': 'custom'
+        'fft_type': FFT_TYPE
     })
 
 @generic_bp.route('/analyze_audio', methods=['POST'])
 def analyze_audio():
-    """Comprehensive audio analysis using custom FFT"""
+    """Comprehensive audio analysis"""
     try:
-        print("🔍 Analyzing audio file (custom FFT)...")
+        print("🔍 Analyzing audio file...")
         
         if 'file' not in request.files:
             return jsonify({'error': 'No file uploaded'}), 400
@@ -531,47 +544,48 @@ def analyze_audio():
         audio_data, sample_rate, file_info = read_audio_file(file)
         
         # Convert to mono if stereo
-        if len(audio_data.shape) > 1:
-            audio_data = np.mean(audio_data, axis=1)
+        audio_data = AudioUtils.to_mono_float32(audio_data)
         
         # Normalize
-        audio_data = audio_data.astype(np.float32)
-        if np.max(np.abs(audio_data)) > 0:
-            audio_data = audio_data / np.max(np.abs(audio_data))
+        audio_data = AudioUtils.peak_normalize(audio_data)
         
         # Calculate audio properties
         duration = len(audio_data) / sample_rate
         
         # Time domain analysis
         rms = np.sqrt(np.mean(audio_data**2))
-        peak = np.max(np.abs(audio_data))
+        peak = AudioUtils.peak_amplitude(audio_data)
         crest_factor = peak / (rms + 1e-10)
         
         # Zero-crossing rate
-        zero_crossings = np.sum(np.diff(np.sign(audio_data)) != 0)
+        zero_crossings = AudioUtils.count_sign_changes(audio_data)
         zcr = zero_crossings / duration
         
-        # Frequency domain analysis with custom FFT
+        # Frequency domain analysis
         n = len(audio_data)
-        window = np.hanning(n)
-        windowed_audio = audio_data * window
+        windowed_audio = audio_data * hann_window(n)
+        
+        fft_data, frequencies, fft_type = positive_spectrum(windowed_audio, sample_rate)
+        magnitude = np.abs(fft_data)
         
-        # Use custom FFT
-        fft_data = np.array(SignalProcessor.custom_fft(windowed_audio))
-        frequencies = np.fft.fftfreq(n, d=1/sample_rate)[:n//2]
-        magnitude = np.abs(fft_data[:n//2])
+        # Running energy total, kept in float64 since bands are read off it as differences of
+        # large sums; the leading 0 lets any contiguous run of bins be summed that way
+        cumulative_energy = np.concatenate(([0.0], np.cumsum(magnitude, dtype=np.float64)))
+        total_energy = cumulative_energy[-1]
         
-        # Spectral centroid
-        spectral_centroid = np.sum(frequencies * magnitude) / np.sum(magnitude)
+        # Spectral centroid and bandwidth from the first two moments of the spectrum, each a
+        # single pass with no full-size temporaries (einsum multiplies all operands inside its
+        # loop). Both are accumulated in float64: M2 - centroid^2 cancels down to a few digits
+        # for tonal input, which float32 sums don't have to spare
+        spectral_centroid = np.einsum('i,i->', frequencies, magnitude, dtype=np.float64) / total_energy
         
         # Spectral bandwidth
-        spectral_bandwidth = np.sqrt(np.sum(((frequencies - spectral_centroid)**2) * magnitude) / np.sum(magnitude))
+        second_moment = np.einsum('i,i,i->', frequencies, frequencies, magnitude, dtype=np.float64) / total_energy
+        spectral_bandwidth = np.sqrt(max(0.0, second_moment - spectral_centroid ** 2))
         
         # Spectral rolloff (85%)
-        total_energy = np.sum(magnitude)
-        cumulative_energy = np.cumsum(magnitude)
-        rolloff_index = np.where(cumulative_energy >= 0.85 * total_energy)[0]
-        spectral_rolloff = frequencies[rolloff_index[0]] if len(rolloff_index) > 0 else frequencies[-1]
+        rolloff_index = np.searchsorted(cumulative_energy[1:], 0.85 * total_energy)
+        spectral_rolloff = frequencies[min(rolloff_index, len(frequencies) - 1)]
         
         # Frequency band energies
         bands = [
@@ -584,14 +598,17 @@ def analyze_audio():
             {'name': 'Brilliance', 'min': 6000, 'max': 20000}
         ]
         
+        # frequencies is ascending, so each inclusive [min, max] band is one slice of bins
+        starts = np.searchsorted(frequencies, [band['min'] for band in bands], side='left')
+        stops = np.searchsorted(frequencies, [band['max'] for band in bands], side='right')
+        band_sums = cumulative_energy[np.maximum(stops, starts)] - cumulative_energy[starts]
+        
         band_energies = []
-        for band in bands:
-            band_mask = (frequencies >= band['min']) & (frequencies <= band['max'])
-            band_energy = np.sum(magnitude[band_mask])
+        for band, band_energy in zip(bands, band_sums):
             band_energies.append({
                 'name': band['name'],
                 'energy': float(band_energy),
-                'percentage': float(band_energy / np.sum(magnitude) * 100)
+                'percentage': float(band_energy / total_energy * 100)
             })
         
         analysis_results = {
@@ -606,14 +623,14 @@ def analyze_audio():
                 'spectral_centroid': float(spectral_centroid),
                 'spectral_bandwidth': float(spectral_bandwidth),
                 'spectral_rolloff': float(spectral_rolloff),
-                'fft_type': 'custom'
+                'fft_type': fft_type
             },
             'band_energies': band_energies,
             'loudness': float(20 * np.log10(rms + 1e-10)),
             'dynamic_range': float(20 * np.log10(peak / (rms + 1e-10)))
         }
         
-        print(f"✅ Audio analysis completed for {file.filename} with custom FFT")
+        print(f"✅ Audio analysis completed for {file.filename} ({fft_type})")
         
         return jsonify(analysis_results)
         
@@ -640,27 +657,23 @@ def get_audio_waveform():
         audio_data, sample_rate, file_info = read_audio_file(file)
         
         # Convert to mono if stereo
-        if len(audio_data.shape) > 1:
-            audio_data = np.mean(audio_data, axis=1)
+        audio_data = AudioUtils.to_mono_float32(audio_data)
         
         # Normalize
-        audio_data = audio_data.astype(np.float32)
-        if np.max(np.abs(audio_data)) > 0:
-            audio_data = audio_data / np.max(np.abs(audio_data))
+        audio_data = AudioUtils.peak_normalize(audio_data)
         
-        # Limit data size for frontend (to prevent huge responses)
+        # Limit data size for frontend (to prevent huge responses) with a min/max envelope,
+        # which keeps the peaks plain decimation would skip
         max_points = 10000
-        if len(audio_data) > max_points:
-            step = len(audio_data) // max_points
-            audio_data = audio_data[::step]
+        duration = len(audio_data) / sample_rate
+        audio_data, _ = VisualizationUtils.min_max_envelope(audio_data, max_points)
         
         # Create time array
-        duration = len(audio_data) / sample_rate
         time = np.linspace(0, duration, len(audio_data))
         
         waveform_data = {
-            'time': time.tolist(),
-            'amplitude': audio_data.tolist(),
+            'time': time,
+            'amplitude': audio_data,
             'sample_rate': sample_rate,
             'duration': duration,
             'samples': len(audio_data),
@@ -683,9 +696,10 @@ def read_audio_file(file):
     file_ext = os.path.splitext(file.filename)[1].lower()
     
     try:
-        # Try soundfile first (supports most formats)
+        # Try soundfile first (supports most formats); libsndfile converts to float32 while
+        # decoding, which halves the buffer and saves the later float32 copy
         file.stream.seek(0)
-        audio_data, sample_rate = sf.read(file.stream)
+        audio_data, sample_rate = sf.read(file.stream, dtype='float32')
         file_info = {
             'format': 'detected by soundfile',
             'sample_rate': sample_rate,
@@ -717,6 +731,9 @@ def read_audio_file(file):
         # Try librosa for other formats
         elif file_ext in ['.mp3', '.m4a', '.flac', '.ogg']:
             try:
+                # librosa is slow to import, so only load it for this fallback
+                import librosa
+                
                 file.stream.seek(0)
                 # Save to temporary file for librosa
                 with tempfile.NamedTemporaryFile(delete=False, suffix=file_ext) as tmp:
@@ -724,12 +741,14 @@ def read_audio_file(file):
                     audio_data, sample_rate = librosa.load(tmp.name, sr=None, mono=False)
                     os.unlink(tmp.name)  # Clean up
                 
+                # librosa returns (channels, samples); the other readers give (samples, channels)
+                audio_data = audio_data.T
                 file_info = {
                     'format': file_ext[1:].upper(),
                     'sample_rate': sample_rate,
                     'duration': len(audio_data) / sample_rate,
                     'samples': len(audio_data),
-                    'channels': audio_data.shape[0] if len(audio_data.shape) > 1 else 1
+                    'channels': audio_data.shape[1] if len(audio_data.shape) > 1 else 1
                 }
                 return audio_data, sample_rate, file_info
                 
@@ -739,75 +758,289 @@ def read_audio_file(file):
         else:
             raise Exception(f"Unsupported file format: {file_ext}")
         
+
+# Sample formats read_wav_file_mmap maps as is: signed PCM and float need no offset before the
+# peak normalization (8-bit WAV is unsigned around 128, so it goes to soundfile instead)
+MMAP_WAV_DTYPES = (np.int16, np.int32, np.float32, np.float64)
+
+def upload_disk_path(file):
+    """Path of the file behind an upload stream if it already lives on disk, else None"""
+    name = getattr(file.stream, 'name', None)
+    return name if isinstance(name, str) and os.path.isfile(name) else None
+
+def read_wav_file_mmap(path):
+    """
+    Read a WAV on disk through a memory map and downmix it to float32 mono
+    Returns: audio_data, sample_rate, file_info
+    """
+    sample_rate, mapped = wavfile.read(path, mmap=True)
+    if mapped.dtype not in MMAP_WAV_DTYPES:
+        raise ValueError(f"{mapped.dtype} samples are not read through the memory map")
+    channels = mapped.shape[1] if mapped.ndim > 1 else 1
+    
+    # The downmix reads the mapped pages directly; only the mono result is allocated
+    audio_data = AudioUtils.to_mono_float32(mapped)
+    if np.may_share_memory(audio_data, mapped):
+        audio_data = audio_data.copy()
+    del mapped
+    
+    file_info = {
+        'format': 'WAV (memory-mapped)',
+        'sample_rate': sample_rate,
+        'duration': len(audio_data) / sample_rate,
+        'samples': len(audio_data),
+        'channels': 'mono (converted from stereo)' if channels > 1 else 'mono'
+    }
+    return audio_data, sample_rate, file_info
+
+def read_audio_file_streamed(file, blocksize=32768):
+    """
+    Decode an upload with soundfile block by block, downmixing each block into a float32 mono buffer
+    Returns: audio_data, sample_rate, file_info
+    """
+    file.stream.seek(0)
+    with sf.SoundFile(file.stream) as sound_file:
+        sample_rate, channels = sound_file.samplerate, sound_file.channels
+        # Only the mono result and one decoded block are ever held, never the whole multichannel signal
+        audio_data = np.empty(sound_file.frames, dtype=np.float32)
+        filled = 0
+        for block in sound_file.blocks(blocksize=blocksize, dtype='float32', always_2d=True):
+            audio_data[filled:filled + len(block)] = AudioUtils.to_mono_float32(block)
+            filled += len(block)
+    
+    audio_data = audio_data[:filled]
+    file_info = {
+        'format': 'detected by soundfile (streamed)',
+        'sample_rate': sample_rate,
+        'duration': filled / sample_rate,
+        'samples': filled,
+        'channels': 'mono (converted from stereo)' if channels > 1 else 'mono'
+    }
+    return audio_data, sample_rate, file_info
+
+def read_audio_file_mono(file):
+    """
+    Read audio file as float32 mono, memory-mapping WAV uploads that are already on disk
+    Returns: audio_data, sample_rate, file_info
+    """
+    # In-memory uploads are decoded from memory: writing them out just to map them costs more than it saves
+    path = upload_disk_path(file)
+    if path and os.path.splitext(file.filename)[1].lower() in ['.wav', '.wave']:
+        try:
+            return read_wav_file_mmap(path)
+        except ValueError as e:
+            # e.g. 24-bit PCM, which wavfile cannot map, or unsigned 8-bit
+            print(f"⚠️  Memory-mapped WAV read failed, decoding in memory: {e}")
+            file.stream.seek(0)
+    
+    try:
+        return read_audio_file_streamed(file)
+    except Exception as e:
+        # Formats libsndfile cannot open go through read_audio_file's scipy/librosa fallbacks
+        print(f"⚠️  Streamed decode failed, trying the other readers: {e}")
+        file.stream.seek(0)
+    
+    audio_data, sample_rate, file_info = read_audio_file(file)
+    
+    if len(audio_data.shape) > 1:
+        file_info['channels'] = 'mono (converted from stereo)'
+        print("🔄 Converted stereo to mono")
+    else:
+        file_info['channels'] = 'mono'
+    
+    return AudioUtils.to_mono_float32(audio_data), sample_rate, file_info
+
+@lru_cache(maxsize=2)
+def hann_window(n):
+    """Read-only float32 Hann window of length n, shared by requests for same-length files
+
+    Windows span whole files (about 53 MB for 5 minutes at 44.1 kHz), so only the last two are kept.
+    """
+    window = np.hanning(n).astype(np.float32)
+    window.flags.writeable = False
+    return window
+
+def positive_spectrum(windowed_audio, sample_rate):
+    """
+    Positive-frequency FFT of a real signal
+    Returns: fft_data, frequencies, fft_type
+    """
+    if USE_CUSTOM_FFT:
+        # custom_fft zero-pads to a power of 2, so the bins follow the padded length
+        fft_data = SignalProcessor.custom_fft(windowed_audio)
+        m = len(fft_data)
+        return fft_data[:m // 2], np.fft.fftfreq(m, d=1/sample_rate)[:m // 2].astype(np.float32), FFT_TYPE
+    
+    # Real-input transform at a length pocketfft/FFTW factor well: n/2 + 1 bins, no Python loop.
+    # float32 audio gives a complex64 spectrum; the bin frequencies match it in float32
+    m = fft.next_fast_len(len(windowed_audio), real=True)
+    frequencies = fft.rfftfreq(m, d=1/sample_rate).astype(np.float32)
+    return fft.rfft(windowed_audio, n=m, workers=FFT_WORKERS), frequencies, FFT_TYPE
+
+def read_normalized_mono(file):
+    """
+    read_audio_file_mono, peak-normalized to [-1, 1]
+    Returns: audio_data, sample_rate, file_info
+    """
+    audio_data, sample_rate, file_info = read_audio_file_mono(file)
+    return AudioUtils.peak_normalize(audio_data), sample_rate, file_info
         
 #======================================================================================================
 import math
+@lru_cache(maxsize=16)
+def equalizer_band_bins(n_fft, sample_rate, band_edges):
+    """
+    Read-only start/stop rfft bin of each (start_freq, end_freq) band
+    Only the edges are cached: slider moves change the gains, not the bins
+    """
+    # rfftfreq is ascending, so each band is one contiguous run of bins: all edges in two
+    # binary-search calls instead of per-band comparisons over the full spectrum
+    frequencies = fft.rfftfreq(n_fft, d=1/sample_rate)
+    start_freqs, end_freqs = zip(*band_edges) if band_edges else ((), ())
+    starts = np.searchsorted(frequencies, start_freqs, side='left')
+    stops = np.searchsorted(frequencies, end_freqs, side='right')
+    starts.flags.writeable = False
+    stops.flags.writeable = False
+    return starts, stops
+
+def equalizer_gain_profile(n_fft, sample_rate, band_key):
+    """
+    float32 gain per bin of apply_equalizer_custom_fft's spectrum
+    band_key: tuple of (start_freq, end_freq, gain) per band
+    """
+    # Gains depend on |f| only, so they are laid out on the ascending rfft bins (mirrored below for
+    # the custom FFT's two-sided spectrum); float32, so multiplying it in keeps complex64 complex64
+    gain_profile = np.ones(n_fft // 2 + 1, dtype=np.float32)
+    
+    starts, stops = equalizer_band_bins(n_fft, sample_rate, tuple((start, end) for start, end, _ in band_key))
+    for (start_freq, end_freq, gain), start, stop in zip(band_key, starts, stops):
+        if abs(gain - 1.0) < 0.001:
+            continue
+        gain_profile[start:stop] *= gain
+        print(f"🎛️ Band {start_freq}-{end_freq}Hz: gain {gain}, {max(stop - start, 0)} bins affected")
+    
+    if USE_CUSTOM_FFT:
+        # Bin n - k of the full spectrum is at -f_k
+        gain_profile = np.concatenate((gain_profile, gain_profile[1:n_fft - n_fft // 2][::-1]))
+    return gain_profile
+
+@lru_cache(maxsize=64)
+def equalizer_block_response(sample_rate, band_key):
+    """
+    Read-only frequency response of the linear-phase FIR that approximates the band gains,
+    on the rfft grid of one overlap-save block
+    """
+    # Zero-phase impulse response of the gains, centered and Hann-windowed to OVERLAP_SAVE_TAPS taps
+    gain_profile = equalizer_gain_profile(OVERLAP_SAVE_BLOCK, sample_rate, band_key)
+    impulse = fft.irfft(gain_profile, n=OVERLAP_SAVE_BLOCK)
+    impulse = np.roll(impulse, OVERLAP_SAVE_TAPS // 2)[:OVERLAP_SAVE_TAPS] * np.hanning(OVERLAP_SAVE_TAPS)
+    response = fft.rfft(impulse, n=OVERLAP_SAVE_BLOCK).astype(np.complex64)
+    response.flags.writeable = False
+    return response
+
+def overlap_save_equalizer(audio, sample_rate, band_key):
+    """
+    Filter float32 audio block by block with the FIR of equalizer_block_response
+    Works on OVERLAP_SAVE_BLOCK samples at a time instead of a whole-file spectrum
+    """
+    n = len(audio)
+    response = equalizer_block_response(sample_rate, band_key)
+    delay = OVERLAP_SAVE_TAPS // 2
+    step = OVERLAP_SAVE_BLOCK - OVERLAP_SAVE_TAPS + 1
+    output = np.empty(n, dtype=np.float32)
+    
+    def filter_block(start):
+        # Block covers audio[start - delay : start - delay + BLOCK]; the first TAPS - 1 outputs
+        # wrap around and are dropped, the rest are output[start : start + step]
+        block = np.zeros(OVERLAP_SAVE_BLOCK, dtype=np.float32)
+        lo = max(start - delay, 0)
+        hi = min(start - delay + OVERLAP_SAVE_BLOCK, n)
+        block[lo - (start - delay):hi - (start - delay)] = audio[lo:hi]
+        spectrum = fft.rfft(block)
+        spectrum *= response
+        filtered = fft.irfft(spectrum, n=OVERLAP_SAVE_BLOCK, overwrite_x=True)
+        stop = min(start + step, n)
+        output[start:stop] = filtered[OVERLAP_SAVE_TAPS - 1:OVERLAP_SAVE_TAPS - 1 + stop - start]
+    
+    # Blocks write disjoint output slices
+    list(overlap_save_pool.map(filter_block, range(0, n, step)))
+    return output
+
 def apply_equalizer_custom_fft(audio, sample_rate, bands):
     """
-    Robust equalizer using CUSTOM FFT with length consistency
+    Robust equalizer with length consistency: real-input FFT by default,
+    the power-of-2 custom FFT when DSP_CUSTOM_FFT=1
     """
+    # 16/24-bit PCM needs no more than float32: the transforms then run in single precision
+    # (complex64 bins, half the bytes of complex128). A no-op for the usual float32 uploads.
+    audio = np.asarray(audio, dtype=np.float32)
     n_original = len(audio)
     
     print(f"🔧 Starting equalizer: {n_original} samples, {sample_rate}Hz, {len(bands)} bands")
     
-    # Ensure audio length is compatible with custom FFT (power of 2)
-    next_power = 2 ** math.ceil(math.log2(n_original))
-    if n_original != next_power:
-        print(f"📏 Padding audio from {n_original} to {next_power} (power of 2)")
-        audio_padded = np.pad(audio, (0, next_power - n_original))
-        n_fft = next_power
-    else:
-        audio_padded = audio
-        n_fft = n_original
+    # Gain of every band; their bins are cached per (length, rate, band edges)
+    band_key = tuple(
+        (band.get('startFreq', 20), band.get('endFreq', 20000), band.get('gain', 1.0)) for band in bands
+    )
     
-    # Use CUSTOM FFT for forward transform
-    print("🌀 Computing FFT with custom implementation...")
-    fft_data = np.array(SignalProcessor.custom_fft(audio_padded))
+    if all(abs(gain - 1.0) < 0.001 for _, _, gain in band_key):
+        # Unity everywhere (e.g. the flat preset): the transform round trip would only rescale
+        print("🎛️ All bands at unity, skipping the FFT")
+        processed_audio = AudioUtils.peak_normalize(np.array(audio, dtype=np.float32))
+        print(f"✅ Equalizer completed. Output: {len(processed_audio)} samples")
+        return processed_audio
     
-    # Generate frequencies
-    frequencies = np.zeros(n_fft)
-    for k in range(n_fft):
-        if k <= n_fft // 2:
-            frequencies[k] = k * sample_rate / n_fft
-        else:
-            frequencies[k] = (k - n_fft) * sample_rate / n_fft
+    # Checked before the GPU path, so the algorithm (and the result) never depends on CUDA being present
+    if not USE_CUSTOM_FFT and OVERLAP_SAVE_MIN_SAMPLES and n_original >= OVERLAP_SAVE_MIN_SAMPLES:
+        # A whole-file spectrum of a long recording is far past the caches; fixed-size blocks stay in them
+        print(f"🧱 Filtering in overlap-save blocks of {OVERLAP_SAVE_BLOCK} samples...")
+        processed_audio = AudioUtils.peak_normalize(overlap_save_equalizer(audio, sample_rate, band_key))
+        print(f"✅ Equalizer completed. Output: {len(processed_audio)} samples")
+        return processed_audio
     
-    print(f"✅ Custom FFT computed: {n_fft} frequency bins")
+    if not USE_CUSTOM_FFT and GPU_EQ and n_original >= GPU_EQ_MIN_SAMPLES and gpu_available():
+        # Long buffers amortize the two host/device copies; the whole round trip runs on cuFFT
+        print("🚀 Computing FFT round trip on the GPU...")
+        n_fft = fft.next_fast_len(n_original, real=True)
+        processed_audio = SignalProcessor.filter_spectrum_gpu(audio, equalizer_gain_profile(n_fft, sample_rate, band_key), n_fft)
+        processed_audio = AudioUtils.peak_normalize(processed_audio)
+        print(f"✅ Equalizer completed. Output: {len(processed_audio)} samples")
+        return processed_audio
     
-    # Create gain profile
-    gain_profile = np.ones(n_fft, dtype=np.float64)
+    if USE_CUSTOM_FFT:
+        # Ensure audio length is compatible with custom FFT (power of 2)
+        n_fft = 2 ** math.ceil(math.log2(n_original))
+        if n_original != n_fft:
+            print(f"📏 Padding audio from {n_original} to {n_fft} (power of 2)")
+        print("🌀 Computing FFT with custom implementation...")
+        fft_data = SignalProcessor.custom_fft(audio)
+    else:
+        # The audio is real, so rfft's n/2 + 1 non-negative bins carry the whole spectrum:
+        # half the bins, memory traffic and arithmetic of the full complex transform.
+        # Zero-padded to a 5-smooth length, since a raw sample count can be (near) prime.
+        print("🌀 Computing real-input FFT...")
+        n_fft = fft.next_fast_len(n_original, real=True) if n_original > 1 else n_original
+        fft_data = fft.rfft(audio, n=n_fft, workers=FFT_WORKERS)
     
-    # Apply each band
-    for band in bands:
-        start_freq = band.get('startFreq', 20)
-        end_freq = band.get('endFreq', 20000)
-        gain = band.get('gain', 1.0)
-        
-        if abs(gain - 1.0) < 0.001:
-            continue
-            
-        band_mask = (np.abs(frequencies) >= start_freq) & (np.abs(frequencies) <= end_freq)
-        gain_profile[band_mask] *= gain
-        
-        print(f"🎛️ Band {start_freq}-{end_freq}Hz: gain {gain}, {np.sum(band_mask)} bins affected")
+    print(f"✅ FFT computed: {len(fft_data)} frequency bins")
+    
+    gain_profile = equalizer_gain_profile(n_fft, sample_rate, band_key)
     
-    # Apply gains
-    modified_fft = fft_data * gain_profile
+    # Apply gains (in place: the spectrum is this call's own array)
+    fft_data *= gain_profile
     
     # Inverse FFT
     print("🔄 Computing inverse FFT...")
-    try:
-        processed_audio_padded = np.real(np.array(SignalProcessor.custom_ifft(modified_fft)))
+    if USE_CUSTOM_FFT:
         # Trim back to original length
-        processed_audio = processed_audio_padded[:n_original]
-    except Exception as e:
-        print(f"⚠️ Custom IFFT failed: {e}, falling back to numpy IFFT")
-        processed_audio_padded = np.real(np.fft.ifft(modified_fft))
-        processed_audio = processed_audio_padded[:n_original]
+        processed_audio = SignalProcessor.custom_ifft(fft_data).real[:n_original].astype(np.float32)
+    else:
+        # irfft of the half spectrum is real already, and may reuse the spectrum's memory;
+        # the padding is cut off again
+        processed_audio = fft.irfft(fft_data, n=n_fft, workers=FFT_WORKERS, overwrite_x=True)[:n_original]
     
-    # Normalize
-    if np.max(np.abs(processed_audio)) > 0:
-        processed_audio = processed_audio / np.max(np.abs(processed_audio))
+    # Normalize in place: a min/max reduction for the peak, then one multiply by its reciprocal
+    processed_audio = AudioUtils.peak_normalize(processed_audio)
     
     print(f"✅ Equalizer completed. Output: {len(processed_audio)} samples")
     return processed_audio
@@ -849,11 +1082,11 @@ def create_default_presets():
         preset_file = os.path.join(PRESETS_DIR, f'{preset_name}.json')
         if not os.path.exists(preset_file):
             preset_data['created_at'] = datetime.now().isoformat()
-            with open(preset_file, 'w', encoding='utf-8') as f:
-                json.dump(preset_data, f, indent=2, ensure_ascii=False)
+            with open(preset_file, 'wb') as f:
+                f.write(orjson.dumps(preset_data, option=orjson.OPT_INDENT_2))
             print(f"📝 Created default preset: {preset_name}")
 
 # Create default presets when module loads
 create_default_presets()
 
-print("🎛️  Generic mode API ready with all endpoints (using custom FFT)!")
\ No newline at end of file
+print(f"🎛️  Generic mode API ready with all endpoints (FFT: {FFT_TYPE})!")
\ No newline at end of file
@@ -1,6 +1,6 @@
-from .ai_mode import ai_bp
+from .ai_mode import AIMode
 from .generic_mode import generic_bp
-from .customized_mode import instruments_bp, animals_bp, voices_bp
+from .customized_mode import CustomizedMode
 
-# Explicitly export all blueprints
-__all__ = ['ai_bp', 'generic_bp', 'instruments_bp', 'animals_bp', 'voices_bp']
\ No newline at end of file
+# Explicitly export the blueprint and mode classes (app.MODE_REGISTRY builds the instances)
+__all__ = ['AIMode', 'generic_bp', 'CustomizedMode']
\ No newline at end of file
@@ -1,15 +1,23 @@
 import torch
 import torchaudio
-from demucs.pretrained import get_model
-from demucs.apply import apply_model
+import contextlib
 import os
 import sys
 import traceback
 import importlib.util
 import tempfile
+import threading
 
 device = 'cuda' if torch.cuda.is_available() else 'cpu'
 
+# Demucs runs under this autocast dtype on CUDA. float16 rather than bfloat16:
+# HTDemucs ends in an iSTFT and cuFFT has no bfloat16 kernels.
+DEMUCS_AUTOCAST_DTYPE = torch.float16
+
+# Batched inputs are zero-padded to the longest one, so a batch only takes inputs at least this
+# fraction of its longest: a short clip never pays for (or waits on) a long song's pass
+DEMUCS_BATCH_MIN_LENGTH_RATIO = 0.8
+
 
 class AIModelManager:
 
@@ -17,20 +25,67 @@ class AIModelManager:
         self.device = device
         self.loaded_models = {}
         self.asteroid_model = None
+        # Serializes model loading between the warmup thread and request threads
+        self._load_lock = threading.RLock()
         
     def load_demucs_model(self, model_name='htdemucs'):
         """Load Demucs model for music source separation"""
-        if model_name not in self.loaded_models:
-            print(f"Loading Demucs model: {model_name}")
-            model = get_model(name=model_name)
-            model = model.to(self.device)
-            model.eval()
-            self.loaded_models[model_name] = model
-            print(f"✅ {model_name} loaded: {model.sources}")
-        return self.loaded_models[model_name]
+        with self._load_lock:
+            if model_name not in self.loaded_models:
+                from demucs.pretrained import get_model
+                
+                print(f"Loading Demucs model: {model_name}")
+                model = get_model(name=model_name)
+                model = model.to(self.device)
+                model.eval()
+                
+                if self.device == 'cuda':
+                    # Compile forward() rather than wrapping the module: apply_model
+                    # dispatches on the model class, which a compiled wrapper would hide
+                    for sub_model in getattr(model, 'models', [model]):
+                        sub_model.forward = torch.compile(sub_model.forward, mode='reduce-overhead')
+                
+                self.loaded_models[model_name] = model
+                print(f"✅ {model_name} loaded: {model.sources}")
+            return self.loaded_models[model_name]
+    
+    @contextlib.contextmanager
+    def demucs_inference(self):
+        """Context for Demucs forward passes: inference mode, plus half-precision autocast on CUDA"""
+        with torch.inference_mode(), torch.autocast('cuda', dtype=DEMUCS_AUTOCAST_DTYPE, enabled=self.device == 'cuda'):
+            yield
+    
+    def warmup(self, model_name='htdemucs_6s'):
+        """Load the separation models and run one silent pass so the first request skips load and compile"""
+        if importlib.util.find_spec('demucs') is not None:
+            try:
+                from demucs.apply import apply_model
+                
+                model = self.load_demucs_model(model_name)
+                silence = torch.zeros(1, model.audio_channels, model.samplerate * 10, device=self.device)
+                with self.demucs_inference():
+                    apply_model(model, silence, device=self.device)
+                print(f"🔥 {model_name} warmed up on {self.device}")
+            except Exception as e:
+                print(f"⚠️  Demucs warmup failed: {e}")
+        
+        if importlib.util.find_spec('asteroid') is not None:
+            try:
+                self.load_asteroid_model()
+                print("🔥 Asteroid model preloaded")
+            except Exception as e:
+                print(f"⚠️  Asteroid warmup failed: {e}")
+    
+    def start_warmup(self, model_name='htdemucs_6s'):
+        """Run warmup() on a background thread"""
+        threading.Thread(target=self.warmup, args=(model_name,), daemon=True).start()
     
     def load_asteroid_model(self):
         """Load Asteroid Multi-Decoder-DPRNN from local clone"""
+        with self._load_lock:
+            return self._load_asteroid_model()
+    
+    def _load_asteroid_model(self):
         if self.asteroid_model is None:
             try:
                 print("Loading Asteroid Multi-Decoder-DPRNN model from local repo...")
@@ -98,12 +153,57 @@ class AIModelManager:
                 raise
         return self.asteroid_model
     
+    def _load_audio(self, audio_path):
+        """Load audio as a (channels, samples) tensor and its sample rate
+
+        audio_path may be a path, an uploaded file, or an already decoded
+        (frames, sample_rate) pair with frames shaped (samples, channels).
+        """
+        if isinstance(audio_path, tuple):
+            frames, sr = audio_path
+            # Transposed view of the decoded array, no copy
+            return torch.from_numpy(frames.T), sr
+        
+        # Handle file-like objects
+        if hasattr(audio_path, 'read'):
+            print("Saving uploaded file to temp location...")
+            temp_input = tempfile.NamedTemporaryFile(suffix='.wav', delete=False)
+            audio_path.save(temp_input.name)
+            audio_path = temp_input.name
+            print(f"   Saved to: {audio_path}")
+        
+        print(f"Loading audio from: {audio_path}")
+        return torchaudio.load(audio_path)
+    
+    def _load_demucs_input(self, audio_path, samplerate):
+        """Load an audio path, uploaded file or decoded frames as a stereo tensor at the model sample rate"""
+        wav, sr = self._load_audio(audio_path)
+        print(f"   Input shape: {tuple(wav.shape)}, Sample rate: {sr}Hz")
+
+        # Convert mono to stereo
+        if wav.shape[0] == 1:
+            print("   Converting mono to stereo...")
+            wav = wav.repeat(2, 1)
+        elif wav.shape[0] > 2:
+            # Every row of a batch must be stereo; like demucs' own convert_audio_channels,
+            # keep the front left/right pair of surround layouts
+            print(f"   Keeping the first 2 of {wav.shape[0]} channels...")
+            wav = wav[:2]
+
+        # Resample if needed
+        if sr != samplerate:
+            print(f"   Resampling from {sr}Hz to {samplerate}Hz...")
+            resampler = torchaudio.transforms.Resample(sr, samplerate)
+            wav = resampler(wav)
+        
+        return wav
+    
     def separate_with_htdemucs(self, audio_path, model_name='htdemucs_6s'):
         """
         Separate audio with Demucs and return TENSORS
         
         Args:
-            audio_path: Path to input audio file or file-like object
+            audio_path: Path to input audio file, file-like object or (frames, sample_rate)
             model_name: Demucs model name
             
         Returns:
@@ -111,63 +211,103 @@ class AIModelManager:
         """
         if audio_path is None:
             return None, None, None, None, None, None, "Please upload an audio file."
-
+        
+        return self.separate_with_htdemucs_batch([audio_path], model_name)[0]
+    
+    def separate_with_htdemucs_batch(self, audio_paths, model_name='htdemucs_6s'):
+        """
+        Separate several inputs, batching those of similar length into one Demucs forward pass
+        
+        Returns:
+            list: one separate_with_htdemucs() result tuple per input
+        """
+        results = [None] * len(audio_paths)
+        for i, result in self.iter_separate_with_htdemucs_batch(audio_paths, model_name):
+            results[i] = result
+        return results
+    
+    def iter_separate_with_htdemucs_batch(self, audio_paths, model_name='htdemucs_6s'):
+        """
+        Yield (index, separate_with_htdemucs() result) for each input as soon as it is ready
+        
+        Inputs are grouped by length (each group's shortest is at least
+        DEMUCS_BATCH_MIN_LENGTH_RATIO of its longest), zero-padded to the longest
+        of their group and stacked into a (batch, channels, samples) tensor; the
+        stems are trimmed back to each input's length afterwards. Groups run
+        shortest first.
+        """
         try:
-            # Handle file-like objects
-            if hasattr(audio_path, 'read'):
-                print("Saving uploaded file to temp location...")
-                temp_input = tempfile.NamedTemporaryFile(suffix='.wav', delete=False)
-                audio_path.save(temp_input.name)
-                audio_path = temp_input.name
-                print(f"   Saved to: {audio_path}")
-            
-            print(f"Loading audio from: {audio_path}")
-            wav, sr = torchaudio.load(audio_path)
-            print(f"   Input shape: {wav.shape}, Sample rate: {sr}Hz")
-
-            # Convert mono to stereo
-            if wav.shape[0] == 1:
-                print("   Converting mono to stereo...")
-                wav = wav.repeat(2, 1)
-
-            # Load model
             model = self.load_demucs_model(model_name)
+        except Exception as e:
+            print(f"❌ Error: {e}")
+            traceback.print_exc()
+            for i in range(len(audio_paths)):
+                yield i, (None, None, None, None, None, None, f"❌ Error: {str(e)}")
+            return
+        
+        # A file that fails to load only fails its own request
+        inputs = []
+        for i, audio_path in enumerate(audio_paths):
+            try:
+                inputs.append((i, self._load_demucs_input(audio_path, model.samplerate)))
+            except Exception as e:
+                print(f"❌ Error: {e}")
+                traceback.print_exc()
+                yield i, (None, None, None, None, None, None, f"❌ Error: {str(e)}")
+        
+        groups = []
+        for item in sorted(inputs, key=lambda item: item[1].shape[-1]):
+            if groups and groups[-1][0][1].shape[-1] >= DEMUCS_BATCH_MIN_LENGTH_RATIO * item[1].shape[-1]:
+                groups[-1].append(item)
+            else:
+                groups.append([item])
+        
+        for group in groups:
+            yield from self._separate_htdemucs_group(model, model_name, group)
+    
+    def _separate_htdemucs_group(self, model, model_name, group):
+        """One padded Demucs forward pass over (index, stereo tensor) inputs; yields (index, result)"""
+        try:
+            from demucs.apply import apply_model
             
-            # Resample if needed
-            if sr != model.samplerate:
-                print(f"   Resampling from {sr}Hz to {model.samplerate}Hz...")
-                resampler = torchaudio.transforms.Resample(sr, model.samplerate)
-                wav = resampler(wav)
-                sr = model.samplerate
-
-            print(f"Applying {model_name}...")
-            wav = wav.to(self.device)
+            lengths = [wav.shape[-1] for _, wav in group]
+            batch = torch.zeros(len(group), group[0][1].shape[0], max(lengths))
+            for row, (_, wav) in enumerate(group):
+                batch[row, :, :wav.shape[-1]] = wav
             
-            with torch.no_grad():
+            print(f"Applying {model_name} to a batch of {len(group)}...")
+            batch = batch.to(self.device)
+            
+            with self.demucs_inference():
                 # apply_model expects shape: (batch, channels, samples)
-                sources = apply_model(model, wav[None], device=self.device, progress=True)[0]
+                sources = apply_model(model, batch, device=self.device, progress=True)
             
             print(f"✅ Separation complete.")
             print(f"   Output shape: {sources.shape}")
             print(f"   Sources: {model.sources}")
-
-            # Return tensors directly (shape: [channels, samples] for each stem)
-            output_tensors = [sources[i].cpu() for i in range(sources.shape[0])]
             
-            # Return 6 tensors + success message
-            return (*output_tensors, f"✅ Demucs separation successful! Generated {len(output_tensors)} stems.")
-
+            # Stems go back to float32 before anything downstream clips or quantizes them
+            sources = sources.float().cpu()
         except Exception as e:
             print(f"❌ Error: {e}")
             traceback.print_exc()
-            return None, None, None, None, None, None, f"❌ Error: {str(e)}"
+            for i, _ in group:
+                yield i, (None, None, None, None, None, None, f"❌ Error: {str(e)}")
+            return
+        
+        for row, (i, _) in enumerate(group):
+            # Return tensors directly (shape: [channels, samples] for each stem)
+            output_tensors = [stem[:, :lengths[row]] for stem in sources[row]]
+            
+            # Return 6 tensors + success message
+            yield i, (*output_tensors, f"✅ Demucs separation successful! Generated {len(output_tensors)} stems.")
     
     def separate_voices_with_asteroid(self, audio_path):
         """
         Separate voices using Asteroid Multi-Decoder-DPRNN and return TENSORS
         
         Args:
-            audio_path: Path to audio file or file-like object
+            audio_path: Path to audio file, file-like object or (frames, sample_rate)
             
         Returns:
             tuple: (voice1_tensor, voice2_tensor, voice3_tensor, voice4_tensor, message)
@@ -176,19 +316,10 @@ class AIModelManager:
             return None, None, None, None, "Please upload an audio file."
 
         try:
-            # Handle file-like objects
-            if hasattr(audio_path, 'read'):
-                print("Saving uploaded file to temp location...")
-                temp_input = tempfile.NamedTemporaryFile(suffix='.wav', delete=False)
-                audio_path.save(temp_input.name)
-                audio_path = temp_input.name
-                print(f"   Saved to: {audio_path}")
-            
-            print(f"Asteroid: Loading audio from: {audio_path}")
-            
             # Load audio
-            mixture, sr = torchaudio.load(audio_path)
-            print(f"   Input: shape={mixture.shape}, sample_rate={sr}Hz")
+            print("Asteroid: Loading audio...")
+            mixture, sr = self._load_audio(audio_path)
+            print(f"   Input: shape={tuple(mixture.shape)}, sample_rate={sr}Hz")
             
             # Convert to mono if stereo
             if mixture.shape[0] == 2:
@@ -245,10 +376,9 @@ class AIModelManager:
         print("✅ All models unloaded")
 
 
-ai_manager = AIModelManager()
-
-
 if __name__ == "__main__":
+    ai_manager = AIModelManager()
+    
     test_audio_music = "dataset/02. School Boy-9.wav"
     test_audio_voice = "dataset/4_mixture.wav"
     
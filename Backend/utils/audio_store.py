@@ -0,0 +1,47 @@
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+
+class AudioStore:
+    """Short-lived store of encoded audio, fetched by random download tokens
+
+    Entries expire after ttl seconds; the oldest are evicted first once
+    max_bytes is exceeded.
+    """
+
+    def __init__(self, ttl=600, max_bytes=256 * 1024 * 1024):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def put(self, data):
+        """Store bytes and return their download token"""
+        token = secrets.token_urlsafe(16)
+        with self._lock:
+            self._expire(time.monotonic())
+            self._entries[token] = (time.monotonic() + self.ttl, data)
+            self._bytes += len(data)
+            while self._entries and self._bytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+        return token
+
+    def get(self, token):
+        """Return the bytes for a live token, or None"""
+        with self._lock:
+            self._expire(time.monotonic())
+            entry = self._entries.get(token)
+            return entry[1] if entry is not None else None
+
+    def _expire(self, now):
+        # Entries are in insertion order and share one ttl, so expired ones are at the front
+        while self._entries:
+            token, (expires, data) = next(iter(self._entries.items()))
+            if expires > now:
+                break
+            del self._entries[token]
+            self._bytes -= len(data)
@@ -1,8 +1,113 @@
 import numpy as np
+import orjson
 import scipy.io.wavfile as wavfile
+import soundfile as sf
+from flask import Response
+from numba import config as numba_config, njit, prange, types as nb
+import binascii
+import collections
+import hashlib
 import io
-import json
+import math
 import os
+import struct
+import threading
+import wave
+import zipfile
+from functools import lru_cache
+
+# SIMD base64 (libbase64) when available; the stdlib codec has the same interface
+try:
+    from pybase64 import b64decode, b64encode
+except ImportError:
+    from base64 import b64decode, b64encode
+
+# Size of each PCM chunk yielded by streamed WAV responses
+WAV_STREAM_CHUNK_BYTES = 64 * 1024
+
+# Prefer OpenMP for parallel kernels: with TBB the interpreter hangs on exit once a
+# kernel has run off the main thread, which is every request under waitress
+numba_config.THREADING_LAYER_PRIORITY = ['omp', 'tbb', 'workqueue']
+
+# Test signals at least this long (seconds) are synthesized by the multi-core Numba kernel
+NUMBA_SYNTH_MIN_DURATION = 2.0
+
+
+# Eager signature, so the kernel is ready (or loaded from the on-disk cache) at import
+@njit('void(float64[::1], float64, float64[::1])', parallel=True, nogil=True, fastmath=True, cache=True)
+def _sum_sinusoids(freqs, time_step, out):
+    """out[i] = sum over k of sin(2*pi*freqs[k]*i*time_step), samples split across cores"""
+    for i in prange(out.size):
+        t = i * time_step
+        acc = 0.0
+        for k in range(freqs.size):
+            acc += math.sin(2.0 * math.pi * freqs[k] * t)
+        out[i] = acc
+
+
+# Float inputs are often cached, read-only arrays, which need their own signatures
+_PCM16_SIGNATURES = [
+    nb.void(nb.Array(dtype, 1, 'C', readonly=readonly), nb.int16[::1])
+    for dtype in (nb.float32, nb.float64) for readonly in (False, True)
+]
+
+
+@njit(_PCM16_SIGNATURES, parallel=True, nogil=True, cache=True)
+def _quantize_pcm16(signal, out):
+    """out[i] = signal[i] * 32767, rounded half to even and clipped to int16, in one pass"""
+    for i in prange(signal.size):
+        # Scaled in float32, as the numpy fallback does, so both paths give identical samples
+        v = np.rint(np.float32(signal[i]) * np.float32(32767.0))
+        if v > 32767.0:
+            v = 32767.0
+        elif v < -32768.0:
+            v = -32768.0
+        out[i] = np.int16(v)
+
+
+@njit([nb.int64(nb.Array(dtype, 1, 'C', readonly=readonly))
+      for dtype in (nb.float32, nb.float64) for readonly in (False, True)],
+      nogil=True, cache=True)
+def _count_sign_changes(signal):
+    """Number of i with sign(signal[i]) != sign(signal[i - 1]), zero counting as its own sign"""
+    if signal.size == 0:
+        return 0
+    # Branch-free: on noisy audio the comparison is a coin flip a branch would mispredict
+    count = 0
+    previous = (signal[0] > 0) - (signal[0] < 0)
+    for i in range(1, signal.size):
+        sign = (signal[i] > 0) - (signal[i] < 0)
+        count += sign != previous
+        previous = sign
+    return count
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only, unseekable buffer that a streaming ZipFile writes into"""
+    
+    def __init__(self):
+        self.chunks = []
+    
+    def writable(self):
+        return True
+    
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+    
+    def drain(self):
+        """Return and clear everything written since the last drain"""
+        data = b''.join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+@lru_cache(maxsize=16)
+def _read_settings_file(settings_path, mtime_ns):
+    """Parse a settings file; the mtime in the cache key invalidates edited files"""
+    with open(settings_path, 'rb') as f:
+        return orjson.loads(f.read())
+
 
 class AudioUtils:
     """Audio processing utilities"""
@@ -13,6 +118,12 @@ class AudioUtils:
         base_dir = os.path.dirname(os.path.dirname(__file__))
         return os.path.join(base_dir, 'settings', f'{mode_name}.json')
     
+    @staticmethod
+    def get_test_signal_cache_dir():
+        """Directory holding pre-generated test signal WAV files"""
+        base_dir = os.path.dirname(os.path.dirname(__file__))
+        return os.path.join(base_dir, 'temp', 'test_signals')
+    
     @staticmethod
     def load_audio_file(file):
         """Load audio file and return signal data"""
@@ -23,41 +134,290 @@ class AudioUtils:
             file_buffer = io.BytesIO(file.read())
             sample_rate, audio_data = wavfile.read(file_buffer)
         
-        # Convert to mono if stereo
-        if len(audio_data.shape) > 1:
-            audio_data = np.mean(audio_data, axis=1)
+        # Convert to mono if stereo (accumulating in float32, the precision used downstream)
+        audio_data = AudioUtils.to_mono_float32(audio_data)
         
         # Normalize to [-1, 1]
-        audio_data = audio_data.astype(np.float32)
-        if np.max(np.abs(audio_data)) > 0:
-            audio_data = audio_data / np.max(np.abs(audio_data))
+        audio_data = AudioUtils.peak_normalize(audio_data)
         
         return audio_data, sample_rate
     
+    @staticmethod
+    def decode_wav_base64(data):
+        """Decode a base64 WAV (optionally a data URI) to float32 samples and its sample rate"""
+        if ',' in data:
+            data = data.split(',', 1)[1]
+        try:
+            # Strict decoding takes the vectorized path; padded or wrapped input falls back
+            raw = b64decode(data, validate=True)
+        except binascii.Error:
+            raw = b64decode(data)
+        
+        # PCM16, which is what this server emits, is converted straight from the frame bytes
+        try:
+            with wave.open(io.BytesIO(raw), 'rb') as wav:
+                if wav.getsampwidth() == 2:
+                    channels = wav.getnchannels()
+                    sample_rate = wav.getframerate()
+                    audio = np.frombuffer(wav.readframes(wav.getnframes()), dtype='<i2').astype(np.float32)
+                    audio *= np.float32(1.0 / 32768.0)
+                    return (audio.reshape(-1, channels) if channels > 1 else audio), sample_rate
+        except (wave.Error, EOFError):
+            pass  # float or extensible WAVs are left to libsndfile
+        
+        return sf.read(io.BytesIO(raw), dtype='float32')
+    
+    @staticmethod
+    def read_upload_frames(file, block_frames=256 * 1024):
+        """Read an uploaded audio file into a float32 (frames, channels) array and its sample rate
+
+        Samples are read block by block from the upload stream into one
+        preallocated array, so no byte copy of the file is made on the way.
+        """
+        file.stream.seek(0)
+        with sf.SoundFile(file.stream) as f:
+            if not f.seekable() or f.frames <= 0:
+                return f.read(dtype='float32', always_2d=True), f.samplerate
+            
+            frames = np.empty((f.frames, f.channels), dtype=np.float32)
+            filled = 0
+            while filled < len(frames):
+                read = f.read(out=frames[filled:filled + block_frames])
+                if len(read) == 0:
+                    break
+                filled += len(read)
+            return frames[:filled], f.samplerate
+    
+    @staticmethod
+    def to_mono_float32(audio_data):
+        """Downmix (samples, channels) audio to a float32 mono array in one pass"""
+        if audio_data.ndim == 1:
+            return audio_data.astype(np.float32, copy=False)
+        
+        channels = audio_data.shape[1]
+        if channels == 1:
+            return audio_data[:, 0].astype(np.float32)
+        
+        # Add whole channel columns into one float32 buffer: a reduction along the short
+        # channel axis (np.mean/np.sum with axis=1) runs roughly 10x slower
+        mono = np.add(audio_data[:, 0], audio_data[:, 1], dtype=np.float32)
+        for channel in range(2, channels):
+            np.add(mono, audio_data[:, channel], out=mono)
+        mono *= np.float32(1.0 / channels)
+        return mono
+    
+    @staticmethod
+    def peak_amplitude(signal):
+        """Largest absolute sample value of a float signal"""
+        # max and min reduce without a temporary; np.max(np.abs(x)) allocates a full-size copy
+        if signal.size == 0:
+            return 0.0
+        return float(max(signal.max(), -signal.min()))
+    
+    @staticmethod
+    def count_sign_changes(signal):
+        """np.sum(np.diff(np.sign(signal)) != 0) in one pass, without the three full-size temporaries"""
+        if signal.dtype not in (np.float32, np.float64):
+            signal = signal.astype(np.float64)
+        return int(_count_sign_changes(np.ascontiguousarray(signal)))
+    
+    @staticmethod
+    def peak_normalize(signal):
+        """Scale a float signal to a peak amplitude of 1 (in place unless the array is read-only)"""
+        peak = AudioUtils.peak_amplitude(signal)
+        if peak == 0:
+            return signal
+        # One reciprocal, then a multiply per sample instead of a divide
+        scale = signal.dtype.type(1.0 / peak)
+        if not signal.flags.writeable:
+            return signal * scale
+        signal *= scale
+        return signal
+    
+    @staticmethod
+    def to_pcm16(signal):
+        """Quantize a [-1, 1] float signal to little-endian int16 samples"""
+        if signal.flags.c_contiguous and signal.dtype in (np.float32, np.float64):
+            # Scale, round, clip and cast fused into a single multi-core pass
+            pcm = np.empty(signal.shape, dtype='<i2')
+            _quantize_pcm16(signal.reshape(-1), pcm.reshape(-1))
+            return pcm
+        
+        # Scale into one float32 scratch buffer, round and clip it in place, then cast once
+        scaled = np.multiply(signal, 32767, dtype=np.float32)
+        np.rint(scaled, out=scaled)
+        np.clip(scaled, -32768, 32767, out=scaled)
+        return scaled.astype('<i2', order='C')
+    
     @staticmethod
     def save_audio_to_buffer(signal, sample_rate):
         """Save signal to in-memory buffer"""
-        buffer = io.BytesIO()
+        pcm = AudioUtils.to_pcm16(signal)
+        channels = pcm.shape[1] if pcm.ndim > 1 else 1
         
-        # Convert back to int16 for WAV
-        int_signal = (signal * 32767).astype(np.int16)
-        wavfile.write(buffer, sample_rate, int_signal)
+        # Header and raw PCM written directly, no wavfile round trip
+        buffer = io.BytesIO()
+        buffer.write(AudioUtils.wav_header(len(pcm), int(sample_rate), channels))
+        buffer.write(pcm.data)
         buffer.seek(0)
         
         return buffer
     
+    @staticmethod
+    def encode_wav_bytes(signal, sample_rate):
+        """Encode a [-1, 1] float signal as PCM16 WAV file bytes"""
+        pcm = AudioUtils.to_pcm16(signal)
+        channels = pcm.shape[1] if pcm.ndim > 1 else 1
+        return b''.join((AudioUtils.wav_header(len(pcm), int(sample_rate), channels), pcm.data))
+    
+    @staticmethod
+    def encode_wav_base64(signal, sample_rate):
+        """Encode a [-1, 1] float signal as a base64 PCM16 WAV string"""
+        # base64 output is pure ASCII, which decodes faster than UTF-8
+        return b64encode(AudioUtils.encode_wav_bytes(signal, sample_rate)).decode('ascii')
+    
+    @staticmethod
+    def wav_header(num_frames, sample_rate, channels=1):
+        """Build the 44-byte RIFF header of a 16-bit PCM WAV file"""
+        data_size = num_frames * channels * 2
+        return struct.pack(
+            '<4sI4s4sIHHIIHH4sI',
+            b'RIFF', 36 + data_size, b'WAVE',
+            b'fmt ', 16, 1, channels, sample_rate, sample_rate * channels * 2, channels * 2, 16,
+            b'data', data_size
+        )
+    
+    @staticmethod
+    def stream_audio_response(signal, sample_rate, download_name, as_attachment=False):
+        """Stream signal as a 16-bit WAV response without building the file in memory"""
+        int_signal = AudioUtils.to_pcm16(signal)
+        channels = int_signal.shape[1] if int_signal.ndim > 1 else 1
+        header = AudioUtils.wav_header(len(int_signal), int(sample_rate), channels)
+        pcm = memoryview(int_signal).cast('B')
+        
+        def generate():
+            yield header
+            for start in range(0, len(pcm), WAV_STREAM_CHUNK_BYTES):
+                yield bytes(pcm[start:start + WAV_STREAM_CHUNK_BYTES])
+        
+        response = Response(generate(), mimetype='audio/wav', direct_passthrough=True)
+        response.content_length = len(header) + len(pcm)
+        response.headers.set(
+            'Content-Disposition',
+            'attachment' if as_attachment else 'inline',
+            filename=download_name
+        )
+        return response
+    
+    @staticmethod
+    def prefetch_map(executor, fn, items, depth):
+        """Ordered executor.map that keeps at most depth calls in flight"""
+        pending = collections.deque()
+        for item in items:
+            pending.append(executor.submit(fn, item))
+            if len(pending) >= depth:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    
+    @staticmethod
+    def iter_wav_base64(signal, sample_rate, executor=None, prefetch=8):
+        """Yield a 16-bit WAV of signal as consecutive base64 pieces, one PCM chunk at a time
+        
+        With an executor, chunks are quantized on its threads (numpy releases the GIL)
+        while this thread base64-encodes and yields the ones already done.
+        """
+        frames = signal.reshape(len(signal), -1)
+        channels = frames.shape[1]
+        chunk_frames = max(WAV_STREAM_CHUNK_BYTES // (channels * 2), 1)
+        
+        def pcm_chunk(start):
+            return AudioUtils.to_pcm16(frames[start:start + chunk_frames]).tobytes()
+        
+        starts = range(0, len(frames), chunk_frames)
+        if executor is None:
+            pcm_chunks = map(pcm_chunk, starts)
+        else:
+            pcm_chunks = AudioUtils.prefetch_map(executor, pcm_chunk, starts, prefetch)
+        
+        # Encode whole 3-byte groups only and carry the remainder, so the pieces concatenate cleanly
+        carry = AudioUtils.wav_header(len(frames), int(sample_rate), channels)
+        for pcm in pcm_chunks:
+            data = carry + pcm
+            cut = len(data) - len(data) % 3
+            yield b64encode(data[:cut])
+            carry = data[cut:]
+        yield b64encode(carry)
+    
+    @staticmethod
+    def stream_wav_zip(tracks, sample_rate, download_name):
+        """Stream several (samples, channels) signals as 16-bit WAV files inside an uncompressed ZIP"""
+        def generate():
+            sink = _ChunkSink()
+            with zipfile.ZipFile(sink, mode='w', compression=zipfile.ZIP_STORED) as archive:
+                for name, signal in tracks.items():
+                    frames = signal.reshape(len(signal), -1)
+                    channels = frames.shape[1]
+                    chunk_frames = max(WAV_STREAM_CHUNK_BYTES // (channels * 2), 1)
+                    
+                    info = zipfile.ZipInfo(f'{name}.wav')
+                    info.file_size = 44 + frames.size * 2
+                    with archive.open(info, mode='w') as entry:
+                        entry.write(AudioUtils.wav_header(len(frames), int(sample_rate), channels))
+                        for start in range(0, len(frames), chunk_frames):
+                            entry.write(AudioUtils.to_pcm16(frames[start:start + chunk_frames]).tobytes())
+                            yield sink.drain()
+            # Data descriptor of the last entry and the central directory come on close
+            yield sink.drain()
+        
+        response = Response(generate(), mimetype='application/zip', direct_passthrough=True)
+        response.headers.set('Content-Disposition', 'attachment', filename=download_name)
+        return response
+    
+    @staticmethod
+    def save_audio_to_file(signal, sample_rate, path):
+        """Write signal to a 16-bit WAV file on disk"""
+        int_signal = AudioUtils.to_pcm16(signal)
+        channels = int_signal.shape[1] if int_signal.ndim > 1 else 1
+        with open(path, 'wb') as f:
+            f.write(AudioUtils.wav_header(len(int_signal), int(sample_rate), channels))
+            f.write(int_signal.data)
+    
+    @staticmethod
+    def get_test_signal_path(frequencies, duration=3.0, sample_rate=44100):
+        """Path of the cached WAV for these test signal parameters, synthesized on first use"""
+        key = repr((tuple(sorted(float(f) for f in frequencies)), float(duration), int(sample_rate)))
+        digest = hashlib.blake2b(key.encode(), digest_size=8).hexdigest()
+        cache_dir = AudioUtils.get_test_signal_cache_dir()
+        path = os.path.join(cache_dir, f'test_signal_{digest}.wav')
+        
+        if not os.path.exists(path):
+            signal, sample_rate = AudioUtils.generate_test_signal(sorted(frequencies), duration, sample_rate)
+            os.makedirs(cache_dir, exist_ok=True)
+            # Write under a unique name and rename, so concurrent requests never see a partial file
+            tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+            AudioUtils.save_audio_to_file(signal, sample_rate, tmp_path)
+            os.replace(tmp_path, path)
+        
+        return path
+    
     @staticmethod
     def generate_test_signal(frequencies, duration=3.0, sample_rate=44100):
         """Generate synthetic test signal"""
-        t = np.linspace(0, duration, int(sample_rate * duration), endpoint=False)
-        signal = np.zeros_like(t)
+        num_samples = int(sample_rate * duration)
+        freqs = np.asarray(frequencies, dtype=np.float64)
         
-        for freq in frequencies:
-            signal += np.sin(2 * np.pi * freq * t)
+        if duration >= NUMBA_SYNTH_MIN_DURATION:
+            signal = np.empty(num_samples, dtype=np.float64)
+            _sum_sinusoids(freqs, duration / max(num_samples, 1), signal)
+        else:
+            # One (samples, frequencies) phase matrix, sin() in place, then sum the columns
+            t = np.linspace(0, duration, num_samples, endpoint=False)
+            phases = np.outer(t, 2 * np.pi * freqs)
+            signal = np.sin(phases, out=phases).sum(axis=1)
         
         # Normalize
-        if np.max(np.abs(signal)) > 0:
-            signal = signal / np.max(np.abs(signal))
+        AudioUtils.peak_normalize(signal)
         
         return signal, sample_rate
     
@@ -66,15 +426,16 @@ class AudioUtils:
         """Load mode settings from JSON file - NO DEFAULT FALLBACK"""
         settings_path = AudioUtils.get_settings_path(mode_name)
         
-        # Check if JSON file exists
-        if not os.path.exists(settings_path):
+        # One stat per call both checks the file exists and keys the parsed-settings cache
+        try:
+            mtime_ns = os.stat(settings_path).st_mtime_ns
+        except FileNotFoundError:
             # Return empty settings if file doesn't exist
             print(f"Warning: Settings file not found: {settings_path}")
             return {"sliders": []}
         
         try:
-            with open(settings_path, 'r') as f:
-                return json.load(f)
+            return _read_settings_file(settings_path, mtime_ns)
         except Exception as e:
             print(f"Error loading settings: {e}")
             return {"sliders": []}
@@ -84,5 +445,5 @@ class AudioUtils:
         """Save settings to JSON file"""
         settings_path = AudioUtils.get_settings_path(mode_name)
         os.makedirs(os.path.dirname(settings_path), exist_ok=True)
-        with open(settings_path, 'w') as f:
-            json.dump(settings, f, indent=2)
\ No newline at end of file
+        with open(settings_path, 'wb') as f:
+            f.write(orjson.dumps(settings, option=orjson.OPT_INDENT_2))
\ No newline at end of file
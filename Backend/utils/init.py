@@ -1,5 +1,10 @@
 from .signal_processing import SignalProcessor
 from .audio_utils import AudioUtils
 from .visualization import VisualizationUtils
+from .request_batcher import RequestBatcher
+from .json_provider import OrjsonProvider
+from .stem_cache import StemCache, DecodedStemCache
+from .input_cache import InputCache
+from .audio_store import AudioStore
 
-__all__ = ['SignalProcessor', 'AudioUtils', 'VisualizationUtils']
\ No newline at end of file
+__all__ = ['SignalProcessor', 'AudioUtils', 'VisualizationUtils', 'RequestBatcher', 'OrjsonProvider', 'StemCache', 'DecodedStemCache', 'InputCache', 'AudioStore']
\ No newline at end of file
@@ -0,0 +1,47 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+class InputCache:
+    """Bounded LRU of per-upload results, keyed by the SHA-256 of the uploaded bytes
+
+    Values are tuples; the nbytes of their numpy arrays count towards max_bytes.
+    Cached arrays are made read-only because every later request shares them.
+    """
+
+    def __init__(self, max_entries=32, max_bytes=256 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _value_bytes(value):
+        return sum(item.nbytes for item in value if isinstance(item, np.ndarray))
+
+    def get_or_compute(self, data, compute):
+        """Return compute() for the upload bytes data, reusing the result for identical uploads"""
+        key = hashlib.sha256(data).digest()
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+                return value
+
+        value = compute()
+        for item in value:
+            if isinstance(item, np.ndarray):
+                item.flags.writeable = False
+
+        with self._lock:
+            if key not in self._entries:
+                self._entries[key] = value
+                self._bytes += self._value_bytes(value)
+                while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                    _, evicted = self._entries.popitem(last=False)
+                    self._bytes -= self._value_bytes(evicted)
+        return value
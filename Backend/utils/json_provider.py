@@ -0,0 +1,54 @@
+import numpy as np
+import orjson
+from flask.json.provider import DefaultJSONProvider
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by orjson
+
+    Serializes numpy arrays and scalars natively, so spectrum/spectrogram
+    payloads no longer need a .tolist() pass before jsonify().
+    """
+
+    def _options(self, indent=None):
+        option = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return option
+
+    @staticmethod
+    def _fallback(o):
+        # orjson only handles C-contiguous arrays; slices and transposes land here
+        if isinstance(o, np.ndarray):
+            return o.tolist()
+        return DefaultJSONProvider.default(o)
+
+    def dumps_bytes(self, obj, indent=None):
+        """Serialize obj straight to UTF-8 bytes"""
+        return orjson.dumps(obj, default=self._fallback, option=self._options(indent))
+
+    def dumps(self, obj, **kwargs):
+        return self.dumps_bytes(obj, kwargs.get('indent')).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        # Indented output is kept for debug mode; otherwise skip the str round trip
+        if (self.compact is None and self._app.debug) or self.compact is False:
+            return super().response(*args, **kwargs)
+
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(self.dumps_bytes(obj), mimetype=self.mimetype)
+
+
+def uncompressed(response):
+    """Mark a response for the app's compression hook to pass through as is
+
+    For JSON that is mostly base64 PCM: near incompressible, and brotli over
+    megabytes of it costs ~150 ms per response.
+    """
+    response.skip_compression = True
+    return response
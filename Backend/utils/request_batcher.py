@@ -0,0 +1,87 @@
+import queue
+import threading
+import time
+import types
+
+
+class _PendingRequest:
+    """One queued item and the slot its result is delivered to"""
+
+    def __init__(self, item):
+        self.item = item
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+
+
+class RequestBatcher:
+    """Collect concurrent requests into batches handled by a single worker thread
+
+    Callers block in submit() while the worker gathers up to max_batch_size
+    items (waiting at most max_latency seconds after the first one), then runs
+    batch_fn(list_of_items) once, which must return one result per item. A
+    generator batch_fn instead yields (index, result) pairs, and each caller is
+    released as soon as its pair is yielded.
+    """
+
+    def __init__(self, batch_fn, max_batch_size=4, max_latency=0.05):
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_latency = max_latency
+        self._queue = queue.Queue()
+        self._worker = None
+        self._lock = threading.Lock()
+
+    def submit(self, item):
+        """Queue item and block until its batch has been processed"""
+        self._ensure_worker()
+        pending = _PendingRequest(item)
+        self._queue.put(pending)
+        pending.done.wait()
+
+        if pending.error is not None:
+            raise pending.error
+        return pending.result
+
+    def _ensure_worker(self):
+        """Start the worker thread on first use"""
+        with self._lock:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, daemon=True)
+                self._worker.start()
+
+    def _collect_batch(self):
+        """Block for one request, then gather more until the batch is full or the window closes"""
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_latency
+
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect_batch()
+            try:
+                results = self.batch_fn([pending.item for pending in batch])
+                if isinstance(results, types.GeneratorType):
+                    for index, result in results:
+                        batch[index].result = result
+                        batch[index].done.set()
+                else:
+                    for pending, result in zip(batch, results):
+                        pending.result = result
+            except Exception as e:
+                for pending in batch:
+                    if not pending.done.is_set():
+                        pending.error = e
+            finally:
+                for pending in batch:
+                    pending.done.set()
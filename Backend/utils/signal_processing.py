@@ -1,15 +1,199 @@
 import numpy as np
+import scipy.fft
+import atexit
 import math
+import logging
+import os
+import pickle
+import threading
+from functools import lru_cache
+
+logger = logging.getLogger(__name__)
+
+# Threads per FFT. Every waitress thread may run transforms at once, so one request
+# shouldn't claim all cores (scipy.fft's workers=-1) and oversubscribe the machine.
+FFT_WORKERS = int(os.environ.get('DSP_FFT_WORKERS', min(4, os.cpu_count() or 1)))
+
+# FFTW plans accumulated by the pyFFTW backend, kept across restarts
+FFTW_WISDOM_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'temp', 'fftw_wisdom.pickle')
+
+# custom_fft computes sub-transforms up to this length as a direct DFT matrix product
+CUSTOM_FFT_BASE = 32
+
+# Spectrograms of signals at least this long run on cuFFT through torch.stft when a CUDA
+# device is present; shorter ones don't amortize the host/device copies. DSP_GPU_STFT=0 opts out.
+GPU_STFT_MIN_SAMPLES = 1 << 18
+GPU_STFT = os.environ.get('DSP_GPU_STFT', '1') != '0'
+
+# The same for the generic equalizer's FFT round trip, from this length on; DSP_GPU_EQ=0 opts out
+GPU_EQ_MIN_SAMPLES = 1 << 20
+GPU_EQ = os.environ.get('DSP_GPU_EQ', '1') != '0'
+
+
+@lru_cache(maxsize=1)
+def _torch():
+    """torch, imported on first use (it takes about a second), or None if it isn't installed"""
+    try:
+        import torch
+    except ImportError:
+        return None
+    return torch
+
+
+@lru_cache(maxsize=1)
+def gpu_available():
+    """Whether torch is installed and sees a CUDA device; only probed once a signal passes a GPU length threshold"""
+    torch = _torch()
+    return torch is not None and torch.cuda.is_available()
+
+
+def _band_gain_mask(freqs, lows, highs, gains, out):
+    """out[i] = product of the gains of every band containing freqs[i], mirrored onto negative frequencies
+
+    freqs must be sorted (as rfftfreq is), so every band covers one contiguous run of bins
+    found by binary search and is applied as a single slice multiply, whatever the slider count.
+    """
+    out.fill(1)
+    for starts, stops in (
+        (np.searchsorted(freqs, lows, side='left'), np.searchsorted(freqs, highs, side='right')),
+        # Mirrored bands [-high, -low]; on a non-negative axis this only reaches 0 Hz for bands starting there
+        (np.searchsorted(freqs, -highs, side='left'), np.searchsorted(freqs, -lows, side='right')),
+    ):
+        for start, stop, gain in zip(starts, stops, gains):
+            out[start:stop] *= gain
+
+
+# Per-thread scratch for the equalizer mask, reused while requests keep the same length
+_scratch = threading.local()
+
+
+def _mask_scratch(size):
+    """float32 mask buffer of the given size for the calling thread"""
+    mask = getattr(_scratch, 'mask', None)
+    if mask is None or mask.size != size:
+        mask = _scratch.mask = np.empty(size, dtype=np.float32)
+    return mask
+
+
+@lru_cache(maxsize=2)
+def _rfft_freqs(n, sample_rate):
+    """Read-only rfft bin frequencies
+
+    Only the last two lengths are kept: n is a whole file's length, so each entry can be tens of MB.
+    """
+    freqs = scipy.fft.rfftfreq(n, 1/sample_rate)
+    freqs.flags.writeable = False
+    return freqs
+
+
+@lru_cache(maxsize=8)
+def _torch_window(window_size, dtype, device):
+    """np.hanning-identical (symmetric) Hann window as a tensor on the device"""
+    torch = _torch()
+    return torch.from_numpy(np.hanning(window_size).astype(dtype)).to(device)
+
+
+def _torch_spectrogram_frames(signal, window_size, hop_size, device='cuda'):
+    """|STFT| of signal as a (time, freq) float array, with the first window_size // 2 bins,
+    computed by torch.stft on the device (same frames as the scipy path: no centering)"""
+    torch = _torch()
+    dtype = np.result_type(signal.dtype, np.float32)
+    # One copy into page-locked memory, from which the upload runs asynchronously
+    host = torch.empty(len(signal), dtype=torch.float64 if dtype == np.float64 else torch.float32,
+                       pin_memory=device == 'cuda')
+    host.numpy()[:] = signal
+    spectrum = torch.stft(
+        host.to(device, non_blocking=True), n_fft=window_size, hop_length=hop_size,
+        window=_torch_window(window_size, dtype, device), center=False, return_complex=True
+    )
+    return spectrum[:window_size // 2].abs().T.contiguous().cpu().numpy()
+
+
+def _torch_tensor(array, device):
+    """float32 copy of an array on the device (torch.tensor copies, so read-only cached arrays are fine)"""
+    torch = _torch()
+    return torch.tensor(np.asarray(array, dtype=np.float32), device=device)
+
+
+def _torch_filter_spectrum(signal, gain_profile, n_fft, device='cuda'):
+    """irfft(rfft(signal, n_fft) * gain_profile)[:len(signal)] as float32, computed on the device
+    (cuFFT plans for repeated lengths come from torch's plan cache)"""
+    torch = _torch()
+    gain_profile = _torch_tensor(gain_profile, device)
+    host = torch.empty(len(signal), dtype=torch.float32, pin_memory=device == 'cuda')
+    host.numpy()[:] = signal
+    spectrum = torch.fft.rfft(host.to(device, non_blocking=True), n=n_fft)
+    spectrum *= gain_profile
+    return torch.fft.irfft(spectrum, n=n_fft)[:len(signal)].cpu().numpy()
+
+
+@lru_cache(maxsize=8)
+def _stft_setup(window_size, sample_rate, dtype):
+    """Hann window in the given precision and the positive-frequency axis, shared by every
+    spectrogram with the same window size and sample rate"""
+    window = np.hanning(window_size).astype(dtype)
+    freq_axis = scipy.fft.rfftfreq(window_size, 1/sample_rate)[:window_size // 2]
+    window.flags.writeable = False
+    freq_axis.flags.writeable = False
+    return window, freq_axis
+
 
 class SignalProcessor:
     """Custom signal processing without external libraries"""
     
+    @staticmethod
+    def use_fftw_backend(keepalive_seconds=300, wisdom_path=FFTW_WISDOM_PATH):
+        """Route scipy.fft through pyFFTW with its plan cache enabled, if pyFFTW is installed
+        
+        FFTW wisdom is loaded from wisdom_path and saved back on exit, so plans made at a
+        higher DSP_FFTW_EFFORT survive restarts.
+        """
+        try:
+            import pyfftw
+            import pyfftw.interfaces.scipy_fft
+        except ImportError:
+            return False
+        
+        # Reuse FFTW plans across requests instead of re-planning every transform
+        pyfftw.interfaces.cache.enable()
+        pyfftw.interfaces.cache.set_keepalive_time(keepalive_seconds)
+        pyfftw.config.NUM_THREADS = FFT_WORKERS
+        # FFTW_MEASURE finds faster plans but spends seconds planning each new length (about 20 s
+        # for 30 s of audio), and upload lengths vary, so it is opt-in
+        pyfftw.config.PLANNER_EFFORT = os.environ.get('DSP_FFTW_EFFORT', 'FFTW_ESTIMATE')
+        
+        if wisdom_path:
+            try:
+                with open(wisdom_path, 'rb') as f:
+                    pyfftw.import_wisdom(pickle.load(f))
+            except FileNotFoundError:
+                pass
+            except Exception as e:
+                logger.warning("Ignoring unreadable FFTW wisdom %s: %s", wisdom_path, e)
+            atexit.register(SignalProcessor.save_fftw_wisdom, wisdom_path)
+        
+        scipy.fft.set_global_backend(pyfftw.interfaces.scipy_fft)
+        return True
+    
+    @staticmethod
+    def save_fftw_wisdom(wisdom_path=FFTW_WISDOM_PATH):
+        """Write the accumulated FFTW wisdom to wisdom_path"""
+        import pyfftw
+        
+        os.makedirs(os.path.dirname(wisdom_path), exist_ok=True)
+        # Written next to the target and renamed, so a concurrent start never reads half a file
+        tmp_path = f'{wisdom_path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(pyfftw.export_wisdom(), f)
+        os.replace(tmp_path, wisdom_path)
+    
     @staticmethod
     def custom_fft(x):
-        """Custom FFT implementation using Cooley-Tukey algorithm"""
+        """Custom FFT implementation using Cooley-Tukey algorithm, returned as a complex ndarray"""
+        x = np.asarray(x, dtype=np.complex128)
         n = len(x)
         if n <= 1:
-            return x
+            return x.copy()
         
         # Pad to next power of 2 if needed
         next_power = 2 ** math.ceil(math.log2(n))
@@ -17,12 +201,25 @@ class SignalProcessor:
             x = np.pad(x, (0, next_power - n))
             n = next_power
         
-        # Recursive FFT
-        even = SignalProcessor.custom_fft(x[::2])
-        odd = SignalProcessor.custom_fft(x[1::2])
+        # Direct DFTs of the interleaved length-base subsequences (column j holds x[j::n // base])
+        base = min(n, CUSTOM_FFT_BASE)
+        k = np.arange(base)
+        spectrum = np.exp(-2j * np.pi * k[:, None] * k / base) @ x.reshape(base, -1)
         
-        T = [np.exp(-2j * np.pi * k / n) * odd[k] for k in range(n // 2)]
-        return [even[k] + T[k] for k in range(n // 2)] + [even[k] - T[k] for k in range(n // 2)]
+        # Radix-2 butterflies, one whole recursion level per step instead of one Python call per node
+        while spectrum.shape[0] < n:
+            half = spectrum.shape[1] // 2
+            even, odd = spectrum[:, :half], spectrum[:, half:]
+            twiddle = np.exp(-1j * np.pi * np.arange(spectrum.shape[0]) / spectrum.shape[0])[:, None]
+            odd = twiddle * odd
+            spectrum = np.vstack((even + odd, even - odd))
+        return spectrum.ravel()
+    
+    @staticmethod
+    def filter_spectrum_gpu(signal, gain_profile, n_fft):
+        """Real signal through rfft (zero-padded to n_fft), a per-bin gain and irfft on the CUDA
+        device, trimmed back to the signal's length; needs gpu_available()"""
+        return _torch_filter_spectrum(signal, gain_profile, n_fft)
     
     @staticmethod
     def custom_ifft(x):
@@ -37,84 +234,90 @@ class SignalProcessor:
         """
         Apply equalization with multiple frequency bands per slider - FIXED
         """
-        print(f"🔧 Starting equalizer: signal length={len(signal)}, sample_rate={sample_rate}")
-        print(f"🎚️ Slider config: {len(sliders_config)} sliders")
-        
-        # Apply FFT to convert to frequency domain
-        print("🌀 Computing FFT...")
-        fft_result = np.array(SignalProcessor.custom_fft(signal))
-        freqs = np.fft.fftfreq(len(fft_result), 1/sample_rate)
-        print(f"✅ FFT computed: {len(fft_result)} frequency bins")
+        logger.debug("🔧 Starting equalizer: signal length=%s, sample_rate=%s", len(signal), sample_rate)
+        logger.debug("🎚️ Slider config: %s sliders", len(sliders_config))
         
-        # Create frequency mask (start with no changes)
-        frequency_mask = np.ones(len(fft_result), dtype=complex)
+        # Apply FFT to convert to frequency domain, zero-padded to a 5-smooth length (a power of 2,
+        # as custom_fft needed, can nearly double the transform). The signal is real, so the half
+        # spectrum carries everything and the negative frequencies the full FFT masked are implied.
+        logger.debug("🌀 Computing FFT...")
+        n = scipy.fft.next_fast_len(len(signal), real=True) if len(signal) > 1 else len(signal)
+        fft_result = scipy.fft.rfft(signal, n=n, workers=FFT_WORKERS)
+        freqs = _rfft_freqs(n, sample_rate)
+        logger.debug("✅ FFT computed: %s frequency bins", len(fft_result))
         
-        # Apply each slider's gain to its frequency bands
+        # Flatten every slider's frequency bands into (low, high, gain) arrays
+        lows, highs, gains = [], [], []
         for i, (slider_config, gain) in enumerate(zip(sliders_config, slider_values)):
             frequency_bands = slider_config['frequency_bands']
-            print(f"🎛️ Processing slider {i}: '{slider_config['name']}' with gain {gain}")
-            print(f"   Frequency bands: {frequency_bands}")
+            logger.debug("🎛️ Processing slider %s: '%s' with gain %s", i, slider_config['name'], gain)
+            logger.debug("   Frequency bands: %s", frequency_bands)
             
-            for band_idx, band in enumerate(frequency_bands):
-                low_freq, high_freq = band
-                
-                # Find indices in this frequency range (positive frequencies only)
-                indices = np.where((freqs >= low_freq) & (freqs <= high_freq))[0]
-                
-                # Apply the gain to these frequency components
-                frequency_mask[indices] *= gain
-                
-                # Also apply to negative frequencies (symmetric)
-                neg_indices = np.where((freqs >= -high_freq) & (freqs <= -low_freq))[0]
-                frequency_mask[neg_indices] *= gain
-                
-                print(f"   Band {band_idx}: {low_freq}-{high_freq}Hz -> {len(indices)} bins affected")
+            for low_freq, high_freq in frequency_bands:
+                lows.append(low_freq)
+                highs.append(high_freq)
+                gains.append(gain)
+        
+        # Build the frequency mask, one slice per band (positive and mirrored negative frequencies)
+        frequency_mask = _mask_scratch(len(fft_result))
+        _band_gain_mask(
+            freqs,
+            np.array(lows, dtype=np.float64), np.array(highs, dtype=np.float64), np.array(gains, dtype=np.float64),
+            frequency_mask
+        )
         
         # Apply the frequency mask
-        print("🎨 Applying frequency mask...")
-        modified_fft = fft_result * frequency_mask
+        logger.debug("🎨 Applying frequency mask...")
+        fft_result *= frequency_mask
         
-        # Convert back to time domain
-        print("🔄 Computing inverse FFT...")
-        processed_signal = np.real(SignalProcessor.custom_ifft(modified_fft))
+        # Convert back to time domain (a float32 signal stays complex64/float32 throughout)
+        logger.debug("🔄 Computing inverse FFT...")
+        # Trimmed back to the input length, so the padding never reaches playback or the plots
+        processed_signal = scipy.fft.irfft(fft_result, n=n, workers=FFT_WORKERS, overwrite_x=True)[:len(signal)]
         
-        # Normalize to prevent clipping
-        if np.max(np.abs(processed_signal)) > 0:
-            max_val = np.max(np.abs(processed_signal))
-            processed_signal = processed_signal / max_val
-            print(f"📏 Normalized signal (max amplitude: {max_val:.3f})")
+        # Normalize to prevent clipping (in place: the inverse FFT output is a fresh array)
+        max_val = max(processed_signal.max(), -processed_signal.min()) if processed_signal.size else 0
+        if max_val > 0:
+            processed_signal /= max_val
+            logger.debug("📏 Normalized signal (max amplitude: %.3f)", max_val)
         
-        print(f"✅ Equalizer completed. Output signal length: {len(processed_signal)}")
+        logger.debug("✅ Equalizer completed. Output signal length: %s", len(processed_signal))
         return processed_signal
     
     @staticmethod
     def compute_spectrogram(signal, window_size=1024, hop_size=512, sample_rate=44100):
-        """Generate spectrogram using custom FFT - Returns 2D array with time and frequency axes"""
-        print(f"📊 Computing spectrogram: signal={len(signal)}, window={window_size}, hop={hop_size}")
+        """Generate spectrogram with a batched real FFT - Returns 2D array with time and frequency axes"""
+        logger.debug("📊 Computing spectrogram: signal=%s, window=%s, hop=%s", len(signal), window_size, hop_size)
         
         # Ensure signal length is sufficient
         if len(signal) < window_size:
             signal = np.pad(signal, (0, window_size - len(signal)))
         
         num_frames = (len(signal) - window_size) // hop_size + 1
-        spectrogram = []
         
         # Calculate time axis
         time_axis = np.arange(num_frames) * hop_size / sample_rate
         
-        # Calculate frequency axis (only positive frequencies)
-        freq_axis = np.fft.fftfreq(window_size, 1/sample_rate)[:window_size // 2]
+        # Cached frequency axis (only positive frequencies) and Hann window, the window in the
+        # signal's own precision so float32 audio gets a complex64 transform
+        window, freq_axis = _stft_setup(window_size, sample_rate, np.result_type(signal.dtype, np.float32))
+        
+        logger.debug("📈 Spectrogram frames: %s, frequency bins: %s", num_frames, len(freq_axis))
         
-        print(f"📈 Spectrogram frames: {num_frames}, frequency bins: {len(freq_axis)}")
+        if GPU_STFT and len(signal) >= GPU_STFT_MIN_SAMPLES and gpu_available():
+            spectrogram_array = _torch_spectrogram_frames(signal, window_size, hop_size).T
+            logger.debug("✅ Spectrogram computed on GPU: shape %s", spectrogram_array.shape)
+            return spectrogram_array, time_axis, freq_axis
         
-        for i in range(num_frames):
-            start = i * hop_size
-            end = start + window_size
-            window = signal[start:end] * np.hanning(window_size)
-            fft_frame = np.abs(SignalProcessor.custom_fft(window))
-            magnitude = np.abs(fft_frame[:window_size // 2])
-            spectrogram.append(magnitude)
+        # All frames as one (num_frames, window_size) matrix, transformed in a single rfft call.
+        # pocketfft runs these many short transforms about twice as fast as the pyFFTW
+        # interface (which wins on the equalizer's single long one), so it is selected here;
+        # set_backend is thread-local, so other requests keep the global backend.
+        frames = np.lib.stride_tricks.sliding_window_view(signal, window_size)[::hop_size][:num_frames]
+        windowed = frames * window
+        with scipy.fft.set_backend('scipy', only=True):
+            spectrum = scipy.fft.rfft(windowed, axis=1, workers=FFT_WORKERS, overwrite_x=True)
         
-        spectrogram_array = np.array(spectrogram).T
-        print(f"✅ Spectrogram computed: shape {spectrogram_array.shape}")
+        spectrogram_array = np.abs(spectrum[:, :window_size // 2]).T
+        logger.debug("✅ Spectrogram computed: shape %s", spectrogram_array.shape)
         return spectrogram_array, time_axis, freq_axis
\ No newline at end of file
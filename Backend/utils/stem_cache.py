@@ -0,0 +1,93 @@
+import hashlib
+import threading
+import uuid
+from collections import OrderedDict
+
+
+class StemCache:
+    """Bounded LRU of separated stems, keyed by a session id handed to the client
+
+    Each entry holds the stem names, one contiguous float32 array of shape
+    (n_stems, channels, samples), the sample rate and optionally per-stem
+    spectra. The oldest sessions are evicted once max_entries or max_bytes
+    is exceeded.
+    """
+
+    def __init__(self, max_entries=8, max_bytes=512 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def fits(self, nbytes):
+        """Whether an entry of nbytes could be stored at all"""
+        return nbytes <= self.max_bytes
+
+    def put(self, names, stems, sample_rate, spectra=None):
+        """Store stems and return the new session id, or None if the entry alone exceeds max_bytes
+
+        An oversized entry is rejected before anything is evicted, so it never flushes the other sessions.
+        """
+        if not self.fits(self._entry_bytes(stems, spectra)):
+            return None
+        session_id = uuid.uuid4().hex
+        with self._lock:
+            self._entries[session_id] = (list(names), stems, sample_rate, spectra)
+            self._bytes += self._entry_bytes(stems, spectra)
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                _, (_, evicted, _, evicted_spectra) = self._entries.popitem(last=False)
+                self._bytes -= self._entry_bytes(evicted, evicted_spectra)
+        return session_id
+
+    @staticmethod
+    def _entry_bytes(stems, spectra):
+        return stems.nbytes + (spectra.nbytes if spectra is not None else 0)
+
+    def get(self, session_id):
+        """Return (names, stems, sample_rate, spectra) for a live session, or None"""
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is not None:
+                self._entries.move_to_end(session_id)
+            return entry
+
+
+class DecodedStemCache:
+    """Bounded LRU of decoded stem audio, keyed by a fingerprint of the base64 payload
+
+    Lets mix_stems skip base64 + WAV decoding when the client re-sends the same
+    stems with new gains.
+    """
+
+    def __init__(self, max_bytes=512 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def fingerprint(data):
+        """Content hash of a base64 string (blake2b runs far faster than the decode it saves)"""
+        return hashlib.blake2b(data.encode('ascii'), digest_size=16).hexdigest()
+
+    def get_or_decode(self, data, decode):
+        """Return decode(data), reusing the cached result for identical payloads"""
+        key = self.fingerprint(data)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                return entry
+        
+        audio, sr = decode(data)
+        # Cached arrays are shared between requests, so callers must not modify them
+        audio.flags.writeable = False
+        with self._lock:
+            if key not in self._entries:
+                self._entries[key] = (audio, sr)
+                self._bytes += audio.nbytes
+                while self._entries and self._bytes > self.max_bytes:
+                    _, (evicted, _) = self._entries.popitem(last=False)
+                    self._bytes -= evicted.nbytes
+        return audio, sr
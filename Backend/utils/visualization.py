@@ -1,6 +1,64 @@
 import numpy as np
+from numba import config as numba_config, njit, prange
 from typing import List, Union , Dict
 from math import log10
+import logging
+from functools import lru_cache
+
+try:
+    from pybase64 import b64encode
+except ImportError:
+    from base64 import b64encode
+
+logger = logging.getLogger(__name__)
+
+
+@lru_cache(maxsize=8)
+def _log_bin_edges(sample_rate, num_bins, min_freq):
+    """Log-spaced bin edges from min_freq to Nyquist and the geometric bin centers"""
+    edges = np.logspace(np.log10(min_freq), np.log10(sample_rate / 2), num_bins + 1)
+    centers = np.sqrt(edges[:-1] * edges[1:])
+    edges.flags.writeable = False
+    centers.flags.writeable = False
+    return edges, centers
+
+
+# Same threading layer preference as audio_utils: compiling a parallel kernel already
+# starts the layer, so whichever module compiles first has to set it
+numba_config.THREADING_LAYER_PRIORITY = ['omp', 'tbb', 'workqueue']
+
+
+# Tile edge for the cache-blocked transpose in _spectrogram_views
+VIEW_TILE = 32
+
+
+@njit(['void(float64[:, ::1], float32[:, ::1], float64[::1])',
+       'void(float32[:, ::1], float32[:, ::1], float64[::1])'], parallel=True, nogil=True, fastmath=True, cache=True)
+def _spectrogram_views(frames, out, mean_out):
+    """One pass over a (time, freq) magnitude matrix: out[j, t] = frames[t, j] + 1e-10 as float32
+    and mean_out[j] = mean over t of frames[t, j]
+
+    Transposes in VIEW_TILE x VIEW_TILE tiles (a plain transposed copy misses cache on every
+    write), with tiles of frequency bins split across cores.
+    """
+    num_frames, num_bins = frames.shape
+    for jb in prange((num_bins + VIEW_TILE - 1) // VIEW_TILE):
+        j0 = jb * VIEW_TILE
+        j1 = min(j0 + VIEW_TILE, num_bins)
+        for j in range(j0, j1):
+            mean_out[j] = 0.0
+        for t0 in range(0, num_frames, VIEW_TILE):
+            t1 = min(t0 + VIEW_TILE, num_frames)
+            for j in range(j0, j1):
+                acc = 0.0
+                for t in range(t0, t1):
+                    v = frames[t, j]
+                    acc += v
+                    out[j, t] = v + 1e-10  # Add small value to avoid log(0)
+                mean_out[j] += acc
+        for j in range(j0, j1):
+            mean_out[j] /= num_frames
+
 
 class VisualizationUtils:
     """Visualization utilities for signals and spectrograms"""
@@ -10,7 +68,7 @@ class VisualizationUtils:
     def linear_to_audiogram(
     frequencies: Union[List[float], np.ndarray],
         values: Union[List[float], np.ndarray]
-    ) -> Dict[str, List[float]]:
+    ) -> Dict[str, Union[np.ndarray, float]]:
         """
         Convert a linear magnitude spectrum → audiogram-style plot
         (0 dB HL = peak of the signal)
@@ -21,37 +79,57 @@ class VisualizationUtils:
         if freq.shape != mag.shape:
             raise ValueError("frequencies and values must have the same length")
 
-        # Prevent log(0) or log(negative)
-        mag_clipped = np.where(mag <= 0, 1e-10, mag)
+        # Prevent log(0) or log(negative); anything under 1e-6 ends up at the -120 dB floor anyway
+        magnitude_db_fs = np.maximum(mag, 1e-10)
 
-        # Linear magnitude → dB FS
-        magnitude_db_fs = 20.0 * np.log10(mag_clipped)
-        magnitude_db_fs = np.clip(magnitude_db_fs, -120.0, None)
+        # Linear magnitude → dB FS, in place on that one buffer
+        np.log10(magnitude_db_fs, out=magnitude_db_fs)
+        magnitude_db_fs *= 20.0
+        np.maximum(magnitude_db_fs, -120.0, out=magnitude_db_fs)
 
         # Normalize so the peak becomes 0 dB HL (exactly what people want for "audiogram" plots)
         peak_db = np.max(magnitude_db_fs)
         magnitude_db_hl = magnitude_db_fs - peak_db
 
         return {
-            "frequencies":       freq.tolist(),
-            "magnitude_linear":  mag.tolist(),
-            "magnitude_db_fs":   magnitude_db_fs.tolist(),
-            "magnitude_db_hl":   magnitude_db_hl.tolist(),   # this is the one you plot!
+            "frequencies":       freq,
+            "magnitude_linear":  mag,
+            "magnitude_db_fs":   magnitude_db_fs,
+            "magnitude_db_hl":   magnitude_db_hl,   # this is the one you plot!
             "peak_db_fs":        float(peak_db)
         }
     @staticmethod
-    def prepare_spectrogram_data(spectrogram, frequencies, scale='linear'):
-        """Prepare spectrogram data for frequency spectrum visualization"""
-        print(f"📊 Preparing spectrogram data: scale={scale}, shape={spectrogram.shape}")
+    def log_bin_spectrum(frequencies, magnitudes, sample_rate, num_bins=1000, min_freq=20.0):
+        """Average a linear-frequency spectrum into num_bins log-spaced bins up to Nyquist"""
+        edges, centers = _log_bin_edges(int(sample_rate), num_bins, min_freq)
+        
+        idx = np.searchsorted(edges, frequencies, side='right') - 1
+        inside = (idx >= 0) & (idx < num_bins)
+        sums = np.bincount(idx[inside], weights=magnitudes[inside], minlength=num_bins)
+        counts = np.bincount(idx[inside], minlength=num_bins)
+        
+        # Low bins can be narrower than the FFT resolution; interpolate the ones left empty
+        binned = np.interp(centers, frequencies, magnitudes)
+        np.divide(sums, counts, out=binned, where=counts > 0)
+        return centers, binned
+    
+    @staticmethod
+    def prepare_spectrogram_data(spectrogram, frequencies, scale='linear', magnitudes=None):
+        """Prepare spectrogram data for frequency spectrum visualization
+
+        magnitudes may be a precomputed spectrogram.mean(axis=1), which skips the pass over the spectrogram.
+        """
+        logger.debug("📊 Preparing spectrogram data: scale=%s, shape=%s", scale, spectrogram.shape)
         
         if spectrogram.size == 0:
             return {'frequencies': [], 'magnitudes': []}
             
         # Take mean across time for magnitude spectrum
-        magnitudes = np.mean(spectrogram, axis=1)
+        if magnitudes is None:
+            magnitudes = np.mean(spectrogram, axis=1)
         
         if scale == 'audiogram':
-            print("🔄 Converting to audiogram scale...")
+            logger.debug("🔄 Converting to audiogram scale...")
             audiogram_data = VisualizationUtils.linear_to_audiogram(frequencies, magnitudes)
             # Return the dB HL values for audiogram display
             result = {
@@ -61,47 +139,114 @@ class VisualizationUtils:
         else:
             # Linear scale - return original magnitudes
             result = {
-                'frequencies': frequencies.tolist(),
-                'magnitudes': magnitudes.tolist()
+                'frequencies': frequencies,
+                'magnitudes': magnitudes
             }
         
-        print(f"✅ Spectrum data prepared: {len(result['frequencies'])} frequency points, scale={scale}")
+        logger.debug("✅ Spectrum data prepared: %s frequency points, scale=%s", len(result['frequencies']), scale)
         return result
         
     @staticmethod
-    def prepare_spectrogram_2d(spectrogram, time_axis, freq_axis):
-        """Prepare 2D spectrogram data for heatmap visualization"""
-        print(f"🔥 Preparing 2D spectrogram: shape={spectrogram.shape}")
+    def spectrogram_views(spectrogram):
+        """Time-averaged magnitudes (float64) and the C-contiguous float32 dB heatmap of a
+        (freq, time) spectrogram, from a single pass over the spectrogram"""
+        # compute_spectrogram returns the transpose of a C-contiguous (time, freq) array, so this is free
+        frames = np.ascontiguousarray(spectrogram.T)
+        if frames.dtype not in (np.float32, np.float64):
+            frames = frames.astype(np.float64)
+        spectrogram_db = np.empty(spectrogram.shape, dtype=np.float32)
+        magnitudes = np.empty(spectrogram.shape[0], dtype=np.float64)
+        if spectrogram.size:
+            _spectrogram_views(frames, spectrogram_db, magnitudes)
+            # NumPy's SIMD log10 beats a scalar one inside the kernel, and the buffer is float32 and in place
+            np.log10(spectrogram_db, out=spectrogram_db)
+            spectrogram_db *= 10
+        return magnitudes, spectrogram_db
+    
+    @staticmethod
+    def spectrogram_db(spectrogram):
+        """Spectrogram in dB as a C-contiguous float32 array"""
+        return VisualizationUtils.spectrogram_views(spectrogram)[1]
+    
+    @staticmethod
+    def prepare_spectrogram_2d(spectrogram, time_axis, freq_axis, spectrogram_db=None):
+        """Prepare 2D spectrogram data for heatmap visualization
+
+        spectrogram_db may be a precomputed spectrogram_db(spectrogram).
+        """
+        logger.debug("🔥 Preparing 2D spectrogram: shape=%s", spectrogram.shape)
         
         if spectrogram.size == 0:
             return {'z': [[]], 'x': [], 'y': []}
         
         # Convert to dB scale for better visualization
-        spectrogram_db = 10 * np.log10(spectrogram + 1e-10)  # Add small value to avoid log(0)
+        if spectrogram_db is None:
+            spectrogram_db = VisualizationUtils.spectrogram_db(spectrogram)
         
         result = {
-            'z': spectrogram_db.tolist(),
-            'x': time_axis.tolist(),
-            'y': freq_axis.tolist()
+            'z': spectrogram_db,
+            'x': time_axis,
+            'y': freq_axis
         }
-        print(f"✅ 2D spectrogram prepared: {len(result['x'])} time points, {len(result['y'])} freq points")
+        logger.debug("✅ 2D spectrogram prepared: %s time points, %s freq points", len(result['x']), len(result['y']))
         return result
     
     @staticmethod
-    def prepare_signal_data(signal, sample_rate):
-        """Prepare signal data for visualization"""
-        print(f"📈 Preparing signal data: {len(signal)} samples")
+    def pack_arrays(obj):
+        """Replace every ndarray in a nested dict/list with a base64 float32 buffer
+
+        Each array becomes {'dtype': 'float32', 'shape': [...], 'data': <base64>}, which
+        skips per-float text formatting and shrinks plot payloads ~4x. The frontend
+        decodes them with unpackArrays() in general_mode.js.
+        """
+        if isinstance(obj, np.ndarray):
+            packed = np.ascontiguousarray(obj, dtype='<f4')
+            return {
+                'dtype': 'float32',
+                'shape': list(packed.shape),
+                'data': b64encode(packed).decode('ascii')
+            }
+        if isinstance(obj, dict):
+            return {key: VisualizationUtils.pack_arrays(value) for key, value in obj.items()}
+        if isinstance(obj, (list, tuple)):
+            return [VisualizationUtils.pack_arrays(value) for value in obj]
+        return obj
+    
+    @staticmethod
+    def min_max_envelope(signal, max_points):
+        """Interleaved (min, max) of consecutive equal blocks, at most max_points values
+        
+        Unlike keeping every step-th sample, peaks between the kept samples stay visible.
+        Returns the envelope and the block length in samples.
+        """
+        if len(signal) <= max_points:
+            return signal, 1
+        block = -(-len(signal) // (max_points // 2))
         
-        time_axis = np.linspace(0, len(signal) / sample_rate, len(signal))
+        # Whole blocks are reduced through a reshape view; a shorter tail block is added after
+        full = len(signal) // block * block
+        blocks = signal[:full].reshape(-1, block)
+        envelope = np.empty((len(blocks) + (full < len(signal)), 2), dtype=signal.dtype)
+        np.min(blocks, axis=1, out=envelope[:len(blocks), 0])
+        np.max(blocks, axis=1, out=envelope[:len(blocks), 1])
+        if full < len(signal):
+            envelope[-1] = signal[full:].min(), signal[full:].max()
+        return envelope.ravel(), block
+    
+    @staticmethod
+    def prepare_signal_data(signal, sample_rate, plot_points=1000):
+        """Prepare signal data for visualization"""
+        logger.debug("📈 Preparing signal data: %s samples", len(signal))
         
-        # Sample for performance (show every 100th point for smooth plotting)
-        step = max(1, len(signal) // 1000)
-        sampled_time = time_axis[::step]
-        sampled_amplitude = signal[::step]
+        # Sample for performance: keep every step-th sample. They are evenly spaced, so the
+        # client rebuilds the time axis as t0 + i * dt instead of receiving it
+        step = max(1, len(signal) // plot_points)
+        sampled_amplitude = np.ascontiguousarray(signal[::step], dtype=np.float32)
         
         result = {
-            'time': sampled_time.tolist(),
-            'amplitude': sampled_amplitude.tolist()
+            'amplitude': sampled_amplitude,
+            't0': 0.0,
+            'dt': step / sample_rate
         }
-        print(f"✅ Signal data prepared: {len(result['time'])} points")
+        logger.debug("✅ Signal data prepared: %s points", len(result['amplitude']))
         return result
\ No newline at end of file
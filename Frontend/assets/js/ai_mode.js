@@ -4,11 +4,19 @@
 
 const API_BASE = 'http://localhost:5000/api/ai';
 
+// Samples of the mix the backend analyses for the frequency plot (AIMode.positive_spectrum)
+const SPECTRUM_SAMPLES = 100000;
+
 class AISeparationController {
     constructor() {
         this.currentStems = {};
         this.currentVoices = {};
+        this.musicSessionId = null;
+        this.voiceSessionId = null;
         this.sampleRate = 44100;
+        // Decoded AudioBuffers per stems object, reused across mixes
+        this.decodedStems = new WeakMap();
+        this.mixedUrls = {};
         this.init();
     }
     
@@ -61,6 +69,7 @@ class AISeparationController {
             }
             
             this.currentStems = data.stems;
+            this.musicSessionId = data.session_id;
             this.sampleRate = data.sample_rate;
             
             this.showSuccess(statusDiv, data.message);
@@ -104,6 +113,7 @@ class AISeparationController {
             }
             
             this.currentVoices = data.voices;
+            this.voiceSessionId = data.session_id;
             this.sampleRate = data.sample_rate;
             
             this.showSuccess(statusDiv, data.message);
@@ -270,19 +280,7 @@ class AISeparationController {
                 gains[stemName] = parseFloat(slider.value) / 100;
             });
             
-            const response = await fetch(`${API_BASE}/mix_stems`, {
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json'
-                },
-                body: JSON.stringify({
-                    stems: this.currentStems,
-                    gains: gains,
-                    sample_rate: this.sampleRate
-                })
-            });
-            
-            const data = await response.json();
+            const data = await this.mix(this.musicSessionId, this.currentStems, gains);
             
             if (!data.success) {
                 throw new Error(data.error || 'Mixing failed');
@@ -308,19 +306,7 @@ class AISeparationController {
                 gains[voiceKey] = parseFloat(slider.value) / 100;
             });
             
-            const response = await fetch(`${API_BASE}/mix_stems`, {
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json'
-                },
-                body: JSON.stringify({
-                    stems: this.currentVoices,
-                    gains: gains,
-                    sample_rate: this.sampleRate
-                })
-            });
-            
-            const data = await response.json();
+            const data = await this.mix(this.voiceSessionId, this.currentVoices, gains);
             
             if (!data.success) {
                 throw new Error(data.error || 'Mixing failed');
@@ -335,12 +321,178 @@ class AISeparationController {
         }
     }
     
+    async mix(sessionId, stems, gains) {
+        // Mix in the browser when Web Audio is available; the server only computes the spectrum
+        if (window.OfflineAudioContext) {
+            try {
+                return await this.mixInBrowser(sessionId, stems, gains);
+            } catch (error) {
+                console.warn('Browser mix failed, mixing on the server:', error);
+                this.decodedStems.delete(stems);
+            }
+        }
+        return this.requestMix(sessionId, stems, gains);
+    }
+    
+    async decodeStems(stems) {
+        if (!this.decodedStems.has(stems)) {
+            // Decode at the stems' own rate so nothing is resampled
+            const context = new OfflineAudioContext(1, 1, this.sampleRate);
+            const decoded = {};
+            for (const [name, dataUri] of Object.entries(stems)) {
+                decoded[name] = fetch(dataUri)
+                    .then(response => response.arrayBuffer())
+                    .then(bytes => context.decodeAudioData(bytes));
+            }
+            this.decodedStems.set(stems, decoded);
+        }
+        return this.decodedStems.get(stems);
+    }
+    
+    async mixInBrowser(sessionId, stems, gains) {
+        const decoded = await this.decodeStems(stems);
+        const names = Object.keys(gains).filter(name => decoded[name]);
+        if (names.length === 0) {
+            throw new Error('No audio to mix');
+        }
+        const buffers = await Promise.all(names.map(name => decoded[name]));
+        
+        // Same result as mix_stems: stereo, trimmed to the shortest stem, peak-limited to 0.99
+        const length = Math.min(...buffers.map(buffer => buffer.length));
+        const context = new OfflineAudioContext(2, length, this.sampleRate);
+        buffers.forEach((buffer, i) => {
+            const source = context.createBufferSource();
+            const gain = context.createGain();
+            source.buffer = buffer;
+            gain.gain.value = gains[names[i]];
+            source.connect(gain).connect(context.destination);
+            source.start();
+        });
+        const rendered = await context.startRendering();
+        
+        const left = rendered.getChannelData(0);
+        const right = rendered.getChannelData(1);
+        let peak = 0;
+        for (let i = 0; i < length; i++) {
+            peak = Math.max(peak, Math.abs(left[i]), Math.abs(right[i]));
+        }
+        const scale = peak > 0.99 ? 0.99 / peak : 1;
+        
+        const analysis = await this.analyzeMix(sessionId, gains, scale, left, right);
+        
+        const wav = new Blob([this.encodeWav([left, right], scale)], { type: 'audio/wav' });
+        return {
+            success: analysis.success,
+            error: analysis.error,
+            mixed_audio: URL.createObjectURL(wav),
+            sample_rate: this.sampleRate,
+            frequency_data: analysis.frequency_data
+        };
+    }
+    
+    async analyzeMix(sessionId, gains, scale, left, right) {
+        const post = (payload) => fetch(`${API_BASE}/analyze_mixed_audio`, {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json'
+            },
+            body: JSON.stringify(payload)
+        });
+        
+        // While the server holds the session it sums the cached stem spectra, so no audio is sent
+        if (sessionId) {
+            const response = await post({ session_id: sessionId, gains: gains, scale: scale });
+            if (response.status !== 410) {
+                return response.json();
+            }
+        }
+        
+        // Otherwise send the mono downmix of just the samples the server analyses
+        const mono = new Float32Array(Math.min(left.length, SPECTRUM_SAMPLES));
+        for (let i = 0; i < mono.length; i++) {
+            mono[i] = (left[i] + right[i]) * 0.5 * scale;
+        }
+        const audio = await new Promise((resolve, reject) => {
+            const reader = new FileReader();
+            reader.onload = () => resolve(reader.result);
+            reader.onerror = () => reject(reader.error);
+            reader.readAsDataURL(new Blob([this.encodeWav([mono], 1)]));
+        });
+        
+        const response = await post({ audio: audio, sample_rate: this.sampleRate });
+        return response.json();
+    }
+    
+    encodeWav(channels, scale) {
+        // 16-bit PCM WAV, samples interleaved
+        const frames = channels[0].length;
+        const view = new DataView(new ArrayBuffer(44 + frames * channels.length * 2));
+        const writeString = (offset, text) => {
+            for (let i = 0; i < text.length; i++) {
+                view.setUint8(offset + i, text.charCodeAt(i));
+            }
+        };
+        const blockAlign = channels.length * 2;
+        
+        writeString(0, 'RIFF');
+        view.setUint32(4, 36 + frames * blockAlign, true);
+        writeString(8, 'WAVE');
+        writeString(12, 'fmt ');
+        view.setUint32(16, 16, true);
+        view.setUint16(20, 1, true);
+        view.setUint16(22, channels.length, true);
+        view.setUint32(24, this.sampleRate, true);
+        view.setUint32(28, this.sampleRate * blockAlign, true);
+        view.setUint16(32, blockAlign, true);
+        view.setUint16(34, 16, true);
+        writeString(36, 'data');
+        view.setUint32(40, frames * blockAlign, true);
+        
+        let offset = 44;
+        for (let i = 0; i < frames; i++) {
+            for (const channel of channels) {
+                const sample = Math.max(-1, Math.min(1, channel[i] * scale));
+                view.setInt16(offset, Math.round(sample * 32767), true);
+                offset += 2;
+            }
+        }
+        return view.buffer;
+    }
+    
+    async requestMix(sessionId, stems, gains) {
+        // While the server still holds the separated stems only the gains are sent;
+        // if the session has expired (410) the full stems are uploaded instead
+        const post = (payload) => fetch(`${API_BASE}/mix_stems`, {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json'
+            },
+            body: JSON.stringify(payload)
+        });
+        
+        let response = sessionId
+            ? await post({ session_id: sessionId, gains: gains, sample_rate: this.sampleRate })
+            : null;
+        
+        if (!response || response.status === 410) {
+            response = await post({ stems: stems, gains: gains, sample_rate: this.sampleRate });
+        }
+        
+        return response.json();
+    }
+    
     displayMixedResult(data, containerId) {
         const container = document.getElementById(containerId);
         
         // Store frequency data for export
         this.lastFrequencyData = data.frequency_data;
         
+        // Release the previous browser-side mix for this container
+        if (this.mixedUrls[containerId]) {
+            URL.revokeObjectURL(this.mixedUrls[containerId]);
+        }
+        this.mixedUrls[containerId] = data.mixed_audio.startsWith('blob:') ? data.mixed_audio : null;
+        
         let html = `
             <div class="mixed-audio-card">
                 <h5><i class="bi bi-soundwave"></i> Mixed Output</h5>
@@ -224,7 +224,7 @@ async function processImmediately() {
             throw new Error(`Backend error ${response.status}: ${errorText}`);
         }
         
-        const result = await response.json();
+        const result = window.generalMode.unpackArrays(await response.json());
         
         // ⚠️ CRITICAL FIX: Check if this request is still relevant
         if (!isRequestStillRelevant(requestId, currentGainsToProcess)) {
@@ -243,10 +243,11 @@ async function processImmediately() {
         window.generalMode.lastSuccessfulRequestId = requestId;
         
         // Store processed audio buffer for playback
-        if (result.processed_audio_base64) {
-            console.log(`🔊 [Request ${requestId}] Decoding processed audio...`);
-            const audioData = Uint8Array.from(atob(result.processed_audio_base64), c => c.charCodeAt(0));
-            window.generalMode.processedAudioBuffer = await window.generalMode.audioContext.decodeAudioData(audioData.buffer);
+        if (result.processed_audio_token) {
+            console.log(`🔊 [Request ${requestId}] Fetching processed audio...`);
+            const audioResponse = await fetch(`${window.generalMode.API_BASE_URL}/${currentMode}/download_processed/${result.processed_audio_token}`);
+            const audioData = await audioResponse.arrayBuffer();
+            window.generalMode.processedAudioBuffer = await window.generalMode.audioContext.decodeAudioData(audioData);
             console.log(`✅ [Request ${requestId}] Processed audio decoded`);
         }
         
@@ -645,7 +645,7 @@ async function getInputVisualizations(file) {
             throw new Error(`Backend error ${response.status}: ${errorText}`);
         }
         
-        const result = await response.json();
+        const result = unpackArrays(await response.json());
         console.log("✅ Input visualizations received:", result);
         
         if (!result.success) {
@@ -665,6 +665,33 @@ async function getInputVisualizations(file) {
     }
 }
 
+// Decode the base64 float32 buffers the backend sends in place of number lists
+function unpackArrays(value) {
+    if (Array.isArray(value)) {
+        return value.map(unpackArrays);
+    }
+    if (value && typeof value === 'object') {
+        if (value.dtype === 'float32' && typeof value.data === 'string') {
+            const binary = atob(value.data);
+            const bytes = new Uint8Array(binary.length);
+            for (let i = 0; i < binary.length; i++) {
+                bytes[i] = binary.charCodeAt(i);
+            }
+            const flat = new Float32Array(bytes.buffer);
+            if (value.shape.length === 2) {
+                // Heatmap rows as views over the one buffer
+                const [rows, cols] = value.shape;
+                return Array.from({ length: rows }, (_, i) => flat.subarray(i * cols, (i + 1) * cols));
+            }
+            return flat;
+        }
+        for (const key of Object.keys(value)) {
+            value[key] = unpackArrays(value[key]);
+        }
+    }
+    return value;
+}
+
 // Update input visualizations from backend response - FIXED VERSION
 function updateInputVisualizations(result) {
     console.log("🔄 Updating input visualizations...");
@@ -674,14 +701,16 @@ function updateInputVisualizations(result) {
     let freqRange = [0, 1];
     
     // Update input signal plot
-    if (result.input_signal && result.input_signal.time) {
-        const times = result.input_signal.time;
-        timeRange = [0, Math.max(...times)];
+    if (result.input_signal && result.input_signal.amplitude) {
+        // Samples are evenly spaced, so the time axis is just t0 + i * dt
+        const { amplitude, t0, dt } = result.input_signal;
+        timeRange = [0, t0 + (amplitude.length - 1) * dt];
         globalTimeRange = timeRange;
         
         Plotly.react('inputSignalPlot', [{
-            x: times,
-            y: result.input_signal.amplitude,
+            x0: t0,
+            dx: dt,
+            y: amplitude,
             type: 'scatter',
             mode: 'lines',
             line: { color: '#FF6B35', width: 1.5 },
@@ -775,9 +804,10 @@ function updateOutputVisualizations(result) {
     const freqRange = globalFreqRange;
     
     // Update output signal plot - USE SAME TIME RANGE AS INPUT
-    if (result.output_signal && result.output_signal.time) {
+    if (result.output_signal && result.output_signal.amplitude) {
         Plotly.react('outputSignalPlot', [{
-            x: result.output_signal.time,
+            x0: result.output_signal.t0,
+            dx: result.output_signal.dt,
             y: result.output_signal.amplitude,
             type: 'scatter',
             mode: 'lines',
@@ -1085,7 +1115,7 @@ async function processImmediately() {
             throw new Error(`Backend error ${response.status}: ${errorText}`);
         }
         
-        const result = await response.json();
+        const result = unpackArrays(await response.json());
         
         // ⚠️ CRITICAL FIX: Check if this request is still relevant
         if (!isRequestStillRelevant(requestId, currentGainsToProcess)) {
@@ -1104,10 +1134,11 @@ async function processImmediately() {
         lastSuccessfulRequestId = requestId;
         
         // Store processed audio buffer for playback
-        if (result.processed_audio_base64) {
-            console.log(`🔊 [Request ${requestId}] Decoding processed audio...`);
-            const audioData = Uint8Array.from(atob(result.processed_audio_base64), c => c.charCodeAt(0));
-            processedAudioBuffer = await audioContext.decodeAudioData(audioData.buffer);
+        if (result.processed_audio_token) {
+            console.log(`🔊 [Request ${requestId}] Fetching processed audio...`);
+            const audioResponse = await fetch(`${API_BASE_URL}/${currentMode}/download_processed/${result.processed_audio_token}`);
+            const audioData = await audioResponse.arrayBuffer();
+            processedAudioBuffer = await audioContext.decodeAudioData(audioData);
             console.log(`✅ [Request ${requestId}] Processed audio decoded`);
         }
         
@@ -1637,6 +1668,7 @@ window.generalMode = {
     // Processing
     scheduleImmediateProcessing: scheduleImmediateProcessing,
     processImmediately: processImmediately,
+    unpackArrays: unpackArrays,
     showRealTimeFeedback: showRealTimeFeedback,
     
     // Utilities